@@ -10,14 +10,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import io
+import json
 import operator
 import os
+import tarfile
 import tempfile
 
 import pytest
 
 import testinfra
 import testinfra.backend
+import testinfra.host
 from testinfra.backend.base import BaseBackend, HostSpec
 from testinfra.backend.winrm import _quote
 from testinfra.utils.ansible_runner import AnsibleRunner
@@ -646,3 +650,100 @@ def test_command_deadlock(host):
     size = 3 * 1024 * 1024
     output = host.check_output(f"python3 -c 'print(\"a\" * {size})'")
     assert len(output) == size
+
+
+def _make_layer(files):
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode="w") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            if content is None:
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                tar.addfile(info)
+            elif isinstance(content, tuple):
+                info.type = tarfile.SYMTYPE
+                info.linkname = content[0]
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                info.mode = 0o644
+                info.mtime = 1700000000
+                tar.addfile(info, io.BytesIO(content))
+    return data.getvalue()
+
+
+def test_image_backend(tmp_path):
+    blobs = {
+        "config.json": json.dumps(
+            {"architecture": "amd64", "os": "linux", "config": {"User": "1000"}}
+        ).encode(),
+        "layer1.tar": _make_layer(
+            {
+                "etc": None,
+                "etc/os-release": b'ID=debian\nVERSION_ID="12"\n'
+                b"VERSION_CODENAME=bookworm\n",
+                "etc/passwd": b"root:x:0:0:root:/root:/bin/bash\n"
+                b"app:x:1000:1000:App:/srv/app:/bin/sh\n",
+                "etc/group": b"root:x:0:\napp:x:1000:\nstaff:x:50:app,root\n",
+                "etc/removed": b"gone",
+                "var/lib/dpkg/status": b"Package: curl\n"
+                b"Status: install ok installed\nArchitecture: amd64\n"
+                b"Version: 7.88.1-10+deb12u5\n\n"
+                b"Package: old\nStatus: deinstall ok config-files\n"
+                b"Architecture: amd64\nVersion: 1.0\n",
+            }
+        ),
+        "layer2.tar": _make_layer(
+            {
+                "etc/.wh.removed": b"",
+                "srv/app/run.sh": b"#!/bin/sh\necho hello\n",
+                "usr/local/bin/run": ("/srv/app/run.sh",),
+            }
+        ),
+    }
+    blobs["manifest.json"] = json.dumps(
+        [{"Config": "config.json", "Layers": ["layer1.tar", "layer2.tar"]}]
+    ).encode()
+    image = tmp_path / "image.tar"
+    with tarfile.open(image, "w") as tar:
+        for name, content in blobs.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+    host = testinfra.get_host(f"image://{image}")
+    assert host.backend.get_connection_type() == "image"
+    with pytest.raises(RuntimeError, match="Cannot run commands"):
+        host.run("true")
+    assert host.file("/etc/os-release").is_file
+    assert not host.file("/etc/removed").exists
+    assert host.file("/srv").is_directory
+    assert host.file("/srv/app").listdir() == ["run.sh"]
+    run = host.file("/usr/local/bin/run")
+    assert run.is_symlink
+    assert run.linked_to == "/srv/app/run.sh"
+    assert run.contains("^echo")
+    assert run.content_string == "#!/bin/sh\necho hello\n"
+    assert run.mode == 0o644
+    # _version_class is only known once the package database is loaded
+    fresh = testinfra.host.Host(host.backend)
+    assert fresh.package("curl").full_version >= "7.88.1-10"
+    fresh = testinfra.host.Host(host.backend)
+    assert fresh.package.satisfies({"curl": ">=7.88", "old": None}) == {
+        "curl": True,
+        "old": False,
+    }
+    assert host.package("curl").is_installed
+    assert host.package("curl").version == "7.88.1-10+deb12u5"
+    assert not host.package("old").is_installed
+    assert host.user().name == "app"
+    assert host.user().home == "/srv/app"
+    assert host.user().groups == ["app", "staff"]
+    assert host.user("root").gids == [0, 50]
+    assert host.group("staff").members == ["app", "root"]
+    assert not host.group("wheel").exists
+    assert host.system_info.distribution == "debian"
+    assert host.system_info.release == "12"
+    assert host.system_info.codename == "bookworm"
+    assert host.system_info.arch == "x86_64"
@@ -20,8 +20,10 @@ from ipaddress import IPv4Address, IPv6Address, ip_address
 
 import pytest
 
+from testinfra.modules.package import ApkVersion, DebianVersion, RpmVersion
 from testinfra.modules.socket import parse_socketspec
 from testinfra.utils.ansible_runner import AnsibleRunner
+from testinfra.utils.sampling import percentile
 
 all_images = pytest.mark.testinfra_hosts(
     *[
@@ -55,6 +57,84 @@ def test_package(host, docker_image):
         assert release in ssh.release
 
 
+@all_images
+def test_package_snapshot(host):
+    names = ("openssh-server", "sudo", "zsh")
+    expected = {
+        name: (p.is_installed, p.version if p.is_installed else None)
+        for name, p in ((name, host.package(name)) for name in names)
+    }
+    host.package.snapshot()
+    try:
+        for name in names:
+            p = host.package(name)
+            assert (p.is_installed, p.version if p.is_installed else None) == (
+                expected[name]
+            )
+    finally:
+        host.package.clear_snapshot()
+
+
+@pytest.mark.parametrize(
+    "version_class,lower,greater",
+    [
+        (DebianVersion, "1.0", "1.0-1"),
+        (DebianVersion, "1.0~rc1-1", "1.0-1"),
+        (DebianVersion, "9.2p1-2", "1:1.0-1"),
+        (DebianVersion, "1.0-1", "1.0-1+b1"),
+        (DebianVersion, "1.9", "1.10"),
+        (DebianVersion, "1.0a", "1.0+"),
+        (RpmVersion, "1.0~rc1", "1.0"),
+        (RpmVersion, "1.0", "1.0^git1"),
+        (RpmVersion, "1.0b.fc17", "1.0.fc17"),
+        (RpmVersion, "2.0a", "2.0.1"),
+        (RpmVersion, "8.7p1-34.el9", "1:8.0-1"),
+        (RpmVersion, "5.5p1", "5.5p10"),
+        (ApkVersion, "1.2_rc1", "1.2"),
+        (ApkVersion, "1.2", "1.2_p1"),
+        (ApkVersion, "1.2.3-r0", "1.2.3-r1"),
+        (ApkVersion, "1.9", "1.10"),
+        (ApkVersion, "1.2", "1.2a"),
+    ],
+)
+def test_package_version_compare(version_class, lower, greater):
+    assert version_class(lower) < greater
+    assert version_class(greater) > lower
+    assert version_class(lower) != greater
+    assert version_class(lower) == lower
+    assert version_class(lower) <= lower
+
+
+def test_package_version_equivalent():
+    assert DebianVersion("1.0") == "0:1.0-0"
+    assert RpmVersion("1.0-1") == "1.0"
+    assert RpmVersion("1.01") == "1.1"
+    assert RpmVersion("8.7p1-34.el9") < "8.7p1-40"
+    assert ApkVersion("1.2.4-r2") == "1.2.4-r2"
+    assert {"1.0": 1}.get(DebianVersion("1.0")) == 1
+    assert RpmVersion("1.1") in {"1.1"}
+
+
+@all_images
+def test_package_satisfies(host, docker_image):
+    name = "openssh-server"
+    package = host.package(name)
+    version = package.version
+    full_version = package.full_version
+    assert isinstance(version, str)
+    assert full_version == str(full_version)
+    assert host.package.satisfies(
+        {
+            name: f">={full_version}, <{version}.1",
+            "zsh": None,
+        }
+    ) == {name: True, "zsh": False}
+    assert host.package.satisfies({name: f">{full_version}"}) == {name: False}
+    assert host.package.satisfies({name: f"=={full_version}"}) == {name: True}
+    # satisfies() doesn't leave a snapshot behind
+    assert host.package._snapshot is None
+
+
 def test_held_package(host):
     python = host.package("python3")
     assert python.is_installed
@@ -127,6 +207,42 @@ def test_ssh_service(host, docker_image):
     assert ssh.is_enabled
 
 
+@all_images
+def test_service_snapshot(host, docker_image):
+    name = "sshd" if docker_image == "rockylinux9" else "ssh"
+    expected = {
+        attr: getattr(host.service(name), attr)
+        for attr in ("exists", "is_running", "is_enabled", "is_masked")
+    }
+    # get_services() doesn't leave a snapshot behind
+    services = [s.name for s in host.service.get_services()]
+    assert f"{name}.service" in services
+    assert all(s.endswith(".service") for s in services)
+    assert host.service._snapshot is None
+    host.service.snapshot()
+    try:
+        assert f"{name}.service" in [s.name for s in host.service.get_services()]
+        ssh = host.service(name)
+        assert {attr: getattr(ssh, attr) for attr in expected} == expected
+        assert not host.service("nonexistent").exists
+    finally:
+        host.service.clear_snapshot()
+
+
+@pytest.mark.destructive
+def test_wait_for(host):
+    host.check_output("mkdir -p /d && rm -f /d/w")
+    host.check_output("nohup sh -c 'sleep 1 && touch /d/w' >/dev/null 2>&1 &")
+    assert host.wait_for(host.file("/d/w"), 10, attribute="exists") < 10
+    assert host.wait_for(host.service("ssh"), attribute="is_running") < 1
+    socket = host.socket("tcp://0.0.0.0:22")
+    assert host.wait_for(socket, attribute="is_listening") < 1
+    assert host.wait_for(lambda: host.file("/d/w").is_file, 5) < 1
+    with pytest.raises(RuntimeError) as excinfo:
+        host.wait_for(host.file("/d/nonexistent"), 1, attribute="exists")
+    assert "is still false after 1 seconds" in str(excinfo.value)
+
+
 def test_service_systemd_mask(host):
     ssh = host.service("ssh")
     assert not ssh.is_masked
@@ -136,6 +252,39 @@ def test_service_systemd_mask(host):
     assert not ssh.is_masked
 
 
+def test_service_systemd_properties(host):
+    ssh = host.service("ssh")
+    assert ssh.properties("Id", "ActiveState") == {
+        "Id": "ssh.service",
+        "ActiveState": "active",
+    }
+    props = host.service.properties_many(["ssh", "supervisor.service"], ["LoadState"])
+    assert props == {
+        "ssh": {"LoadState": "loaded"},
+        "supervisor.service": {"LoadState": "loaded"},
+    }
+
+
+def test_service_startup_time(host):
+    startup_time = host.service("ssh").startup_time
+    assert isinstance(startup_time, datetime.timedelta)
+    assert host.service("nonexistent").startup_time is None
+    report = host.service.startup_report()
+    assert report["blame"]["ssh.service"] > datetime.timedelta(0)
+    assert report["critical_chain"][0]["unit"].endswith(".target")
+
+
+@pytest.mark.destructive
+def test_service_verify_many(host):
+    host.check_output(
+        "printf '[Service]\\nFoo=bar\\nExecStart=/bin/true\\n' "
+        "> /etc/systemd/system/bad.service"
+    )
+    result = host.service.verify_many(["ssh", "bad.service"])
+    assert result["ssh"] == []
+    assert any("Unknown key name 'Foo'" in line for line in result["bad.service"])
+
+
 def test_salt(host):
     ssh_version = host.salt("pkg.version", "openssh-server", local=True)
     assert ssh_version.startswith("1:9.2")
@@ -201,6 +350,33 @@ def test_socket(host):
             assert len(host.socket(spec).clients) >= 1
 
 
+def test_socket_snapshot(host):
+    specs = (
+        "tcp://22",
+        "tcp://0.0.0.0:22",
+        "tcp://:::22",
+        "tcp://4242",
+        "unix:///run/systemd/private",
+    )
+    expected = {spec: host.socket(spec).is_listening for spec in specs}
+    host.socket.snapshot()
+    try:
+        assert {spec: host.socket(spec).is_listening for spec in specs} == expected
+        assert "unix:///run/systemd/private" in host.socket.get_listening_sockets()
+    finally:
+        host.socket.clear_snapshot()
+
+
+def test_socket_owners(host):
+    assert {p["comm"] for p in host.socket("tcp://0.0.0.0:22").owners} == {"sshd"}
+    assert host.socket("tcp://4242").owners == []
+    owners = {
+        (p["socket"], p["comm"], p["user"])
+        for p in host.socket.listening_with_processes()
+    }
+    assert ("tcp://0.0.0.0:22", "sshd", "root") in owners
+
+
 @all_images
 def test_process(host, docker_image):
     init = host.process.get(pid=1)
@@ -216,6 +392,44 @@ def test_process(host, docker_image):
     assert init.comm == comm
 
 
+@all_images
+def test_process_snapshot(host):
+    expected = host.process.filter(user="root", ppid=1)
+    host.process.snapshot()
+    try:
+        init = host.process.get(pid=1)
+        assert (init.ppid, init.user, init.euid) == (0, "root", 0)
+        assert [p.pid for p in host.process.filter(user="root", ppid=1)] == [
+            p.pid for p in expected
+        ]
+        assert host.process.filter(comm="not_a_process") == []
+    finally:
+        host.process.clear_snapshot()
+
+
+@pytest.mark.parametrize(
+    "values,p,expected",
+    [
+        ([3], 90, 3),
+        ([1, 2, 3, 4], 0, 1),
+        ([1, 2, 3, 4], 50, 2.5),
+        ([4, 1, 3, 2], 100, 4),
+        ([10, 20, 30, 40, 50], 90, 46),
+    ],
+)
+def test_process_percentile(values, p, expected):
+    assert percentile(values, p) == pytest.approx(expected)
+
+
+@all_images
+def test_process_sample(host):
+    usage = host.process.sample({"pid": 1}, duration=1, interval=0.5)
+    assert len(usage["time"]) == 2
+    assert all(rss > 0 for rss in usage["rss"])
+    assert all(threads >= 1 for threads in usage["threads"])
+    assert usage["percentiles"]["cpu"][100] == max(usage["cpu"])
+
+
 def test_user(host):
     user = host.user("sshd")
     assert user.exists
@@ -230,6 +444,66 @@ def test_user(host):
     assert user.password == "!"
 
 
+def test_user_snapshot(host):
+    names = ("root", "sshd", "user", "nosuchuser")
+    attrs = ("uid", "gid", "group", "gids", "groups", "home", "shell", "password")
+
+    def get_users():
+        return {
+            name: user.exists and tuple(getattr(user, attr) for attr in attrs)
+            for name, user in ((name, host.user(name)) for name in names)
+        }
+
+    def get_groups():
+        return {
+            name: group.exists and (group.gid, group.members)
+            for name, group in ((name, host.group(name)) for name in names)
+        }
+
+    expected = (get_users(), get_groups(), host.user().get_local_users)
+    host.user.snapshot()
+    try:
+        assert (get_users(), get_groups(), host.user().get_local_users) == expected
+    finally:
+        host.user.clear_snapshot()
+
+
+def test_iter_output(host):
+    assert list(host.iter_output("seq 25", chunk_lines=10)) == [
+        str(i) for i in range(1, 26)
+    ]
+    assert list(host.iter_output("printf 'a\\n\\nb\\n'", chunk_lines=1)) == [
+        "a",
+        "",
+        "b",
+    ]
+    with pytest.raises(AssertionError):
+        list(host.iter_output("false"))
+    # lines are not split at chunk boundaries
+    assert list(host.iter_output("printf 'aaa\\nb\\ncc'", chunk_lines=2)) == [
+        "aaa",
+        "b",
+        "cc",
+    ]
+    # the temporary file is removed when the iterator is closed
+    before = host.check_output("ls -A /tmp")
+    lines = host.iter_output("seq 5", chunk_lines=2)
+    assert next(lines) == "1"
+    assert host.check_output("ls -A /tmp") != before
+    lines.close()
+    assert host.check_output("ls -A /tmp") == before
+
+
+def test_iter_listings(host):
+    assert sorted(host.file("/etc").iterdir()) == sorted(host.file("/etc").listdir())
+    assert list(host.user().iter_all_users()) == host.user().get_all_users
+    assert list(host.group("root").iter_all_groups()) == (
+        host.group("root").get_all_groups
+    )
+    pkg = host.pip.get_packages(pip_path="/v/bin/pip")["requests"]
+    assert dict(host.pip.iter_packages(pip_path="/v/bin/pip"))["requests"] == pkg
+
+
 def test_user_get_all_users(host):
     user_list = host.user("root").get_all_users
     assert "root" in user_list
@@ -340,6 +614,90 @@ def test_file(host):
     assert f.mode == 0o700
 
 
+def test_file_checksums(host, tmp_path):
+    host.check_output("mkdir -p /d && printf foo > /d/f && printf bar > '/d/f s'")
+    assert host.file.md5sums(["/d/f", "/d/f s", "/d/nonexistent"]) == {
+        "/d/f": "acbd18db4cc2f85cedef654fccc4a4d8",
+        "/d/f s": "37b51d194a7513e45b56f6524f2d51f2",
+        "/d/nonexistent": None,
+    }
+    sha256 = host.file.sha256sums(["/d/f"])
+    assert sha256 == {"/d/f": host.file("/d/f").sha256sum}
+    manifest = tmp_path / "SHA256SUMS"
+    manifest.write_text(f"{sha256['/d/f']}  /d/f\n{'0' * 64}  /d/f s\n")
+    assert host.file.sha256sums(None, manifest=str(manifest)) == {
+        "/d/f s": "fcde2b2edba56bf408601fb721fe9b5c338d10ee429ea04fae5511b68fbf8fb9"
+    }
+    assert host.file.sha256sums(["/d/f"], manifest={"/d/f": sha256["/d/f"]}) == {}
+    # sha256sum escapes backslashes and newlines in paths
+    host.check_output("printf foo > '/d/f\\x' && printf foo > '/d/f\ny'")
+    escaped = f"\\{sha256['/d/f']}  /d/f\\\\x\n\\{sha256['/d/f']}  /d/f\\ny\n"
+    manifest.write_text(escaped)
+    assert host.file.sha256sums(None, manifest=str(manifest)) == {}
+    assert host.file.sha256sums(["/d/f\\x", "/d/f\ny"]) == {
+        "/d/f\\x": sha256["/d/f"],
+        "/d/f\ny": sha256["/d/f"],
+    }
+    with pytest.raises(ValueError):
+        host.file.sha256sums(None)
+
+
+def test_file_content_cache(host):
+    assert host.file.content_cache_size == 0
+    host.file.content_cache_size = 1024
+    try:
+        host.check_output("mkdir -p /d && printf foo > /d/c")
+        f = host.file("/d/c")
+        assert f.content == b"foo"
+        assert host.file("/d/c").content_string == "foo"
+        host.check_output("printf bar > /d/c")
+        assert f.content == b"bar"
+        # /proc files have a zero size and a fixed mtime, never cached
+        uptime = host.file("/proc/uptime")
+        first = uptime.content
+        time.sleep(1.1)
+        assert uptime.content != first
+        host.check_output("rm /d/c")
+        with pytest.raises(RuntimeError):
+            f.content  # noqa: B018
+    finally:
+        host.file.content_cache_size = 0
+
+
+def test_file_search(host):
+    host.check_output("mkdir -p /d && printf 'foo\\nbar=1\\nfoo bar\\n' > /d/s")
+    assert host.file("/d/s").search(["^foo", "bar=[0-9]", "baz"]) == {
+        "^foo": [1, 3],
+        "bar=[0-9]": [2],
+        "baz": [],
+    }
+    assert host.file.search_files(["/d/s", "/d/nonexistent"], ["bar$"]) == {
+        "/d/s": {"bar$": [3]},
+        "/d/nonexistent": {"bar$": []},
+    }
+    # relative paths that awk would take as an assignment or stdin
+    host.check_output("printf 'bar\\n' > a=b && printf 'bar\\n' > -")
+    try:
+        assert host.file.search_files(["a=b", "-"], ["bar$"]) == {
+            "a=b": {"bar$": [1]},
+            "-": {"bar$": [1]},
+        }
+    finally:
+        host.check_output("rm -f a=b ./-")
+
+
+def test_file_matches_local(host, tmp_path):
+    host.check_output("mkdir -p /d && printf 0123456789abcdef > /d/m")
+    local = tmp_path / "m"
+    local.write_bytes(b"0123456789abcdef")
+    f = host.file("/d/m")
+    assert f.matches_local(str(local))
+    assert f.differing_ranges(str(local), block_size=4) == []
+    local.write_bytes(b"0123456789ABcdef++")
+    assert not f.matches_local(str(local))
+    assert f.differing_ranges(str(local), block_size=4) == [(8, 12), (16, 18)]
+
+
 def test_ansible_unavailable(host):
     expected = "Ansible module is only available with ansible connection backend"
     with pytest.raises(RuntimeError) as excinfo:
@@ -538,6 +896,47 @@ def test_mountpoint(host):
     assert len([m for m in mountpoints if m.path == "/"]) == 1
 
 
+def test_mountpoint_snapshot(host):
+    mount_point = host.mount_point
+    assert mount_point.for_path("/proc/self/status").path == "/proc"
+    assert mount_point.for_path("/not/a/mountpoint").path == "/"
+    with pytest.raises(ValueError):
+        mount_point.for_path("relative/path")
+    live = [(m.path, m.device, m.options) for m in mount_point.get_mountpoints()]
+    mount_point.snapshot()
+    try:
+        assert [
+            (m.path, m.device, m.options) for m in mount_point.get_mountpoints()
+        ] == live
+        root_mount = mount_point("/")
+        assert root_mount.exists
+        assert root_mount.filesystem
+        assert not mount_point("/fake/mount").exists
+        assert mount_point.for_path("/proc/1/../self").path == "/proc"
+        assert mount_point.for_path("/").path == "/"
+    finally:
+        mount_point.clear_snapshot()
+
+
+def test_block_device_snapshot(host):
+    block_device = host.block_device
+    devices = block_device.get_block_devices()
+    assert devices
+    assert all(isinstance(d, block_device) for d in devices)
+    live = [(d.device, d.is_rotational, d.scheduler, d.nr_requests) for d in devices]
+    block_device.snapshot()
+    try:
+        assert [
+            (d.device, d.is_rotational, d.scheduler, d.nr_requests)
+            for d in block_device.get_block_devices()
+        ] == live
+        assert all(d.size >= 0 for d in block_device.get_block_devices())
+    finally:
+        block_device.clear_snapshot()
+    with pytest.raises(RuntimeError):
+        block_device("/etc/passwd").scheduler  # noqa: B018
+
+
 def test_sudo_from_root(host):
     assert host.user().name == "root"
     with host.sudo("user"):
@@ -672,6 +1071,54 @@ def test_addr(host):
         assert isinstance(ip_address(ip), (IPv4Address, IPv6Address))
 
 
+@all_images
+def test_addr_reachability(host):
+    targets = ["8.8.8.8", "10.42.13.73", "some_non_resolvable_host"]
+    matrix = host.addr.reachability(targets, [53, 666, None], timeout=1)
+    assert list(matrix) == [
+        (target, port) for target in targets for port in (53, 666, None)
+    ]
+    assert matrix[("8.8.8.8", 53)]["reachable"]
+    assert matrix[("8.8.8.8", 53)]["latency"] >= 0
+    for pair in (
+        ("8.8.8.8", 666),
+        ("10.42.13.73", 53),
+        ("10.42.13.73", None),
+        ("some_non_resolvable_host", None),
+    ):
+        assert matrix[pair] == {"reachable": False, "latency": None}
+
+
+@all_images
+def test_addr_resolve_many(host, monkeypatch):
+    names = ["8.8.8.8", "some_non_resolvable_host"]
+    try:
+        resolved = host.addr.resolve_many(names, family="inet")
+        assert list(resolved) == names
+        assert resolved["8.8.8.8"]["addresses"] == ["8.8.8.8"]
+        assert resolved["some_non_resolvable_host"]["addresses"] == []
+        assert all(r["latency"] >= 0 for r in resolved.values())
+        host.addr.resolve_many(["some_non_resolvable_host"])
+        with monkeypatch.context() as m:
+            m.setattr(host, "run", None)  # served from the cache
+            assert host.addr("8.8.8.8").ipv4_addresses == ["8.8.8.8"]
+            assert host.addr("8.8.8.8").is_resolvable
+            assert not host.addr("some_non_resolvable_host").is_resolvable
+    finally:
+        host.addr.clear_cache()
+
+
+@pytest.mark.testinfra_hosts("docker://rockylinux9")
+def test_http_timings(host):
+    timings = host.http("https://www.google.com/").timings(count=3)
+    assert len(timings["status_codes"]) == 3
+    assert all(t > 0 for t in timings["tls"])
+    for name in ("dns", "connect", "tls", "ttfb", "total"):
+        assert timings["percentiles"][name][100] == max(timings[name])
+    with pytest.raises(RuntimeError, match="All requests"):
+        host.http("http://10.42.13.73/").timings(count=2, timeout=1)
+
+
 @pytest.mark.testinfra_hosts("ansible://debian_bookworm")
 def test_addr_namespace(host):
     namespace_lookup = host.addr("localhost", "ns1")
@@ -699,3 +1146,38 @@ def test_interface(host, family):
     default_itf = host.interface.default(family)
     assert default_itf.name == "eth0"
     assert default_itf.exists
+
+
+@pytest.mark.parametrize(
+    "family",
+    ["inet", "inet6", None],
+)
+def test_interface_snapshot(host, family):
+    def get_interfaces():
+        interfaces = {"default": host.interface.default(family).name}
+        for name in host.interface.names() + ["does_not_exist"]:
+            itf = host.interface(name, family=family)
+            interfaces[name] = itf.exists and (
+                itf.addresses,
+                itf.link,
+                itf.routes(),
+                itf.routes("link"),
+            )
+        return interfaces
+
+    expected = get_interfaces()
+    host.interface.snapshot()
+    try:
+        assert get_interfaces() == expected
+    finally:
+        host.interface.clear_snapshot()
+
+
+def test_interface_stats(host):
+    stats = host.interface("lo").stats(duration=1, interval=0.5)
+    assert len(stats["time"]) == len(stats["rx_bytes"]) == 2
+    assert stats["totals"]["rx_errors"] == 0
+    assert stats["percentiles"]["tx_bytes"][100] == max(stats["tx_bytes"])
+    assert {"lo", "eth0"} <= set(host.interface.stats_all(duration=0.5, interval=0.5))
+    with pytest.raises(RuntimeError):
+        host.interface("does_not_exist").stats(duration=0.5, interval=0.5)
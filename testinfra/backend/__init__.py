@@ -33,6 +33,7 @@ BACKENDS = {
     "lxc": "testinfra.backend.lxc.LxcBackend",
     "openshift": "testinfra.backend.openshift.OpenShiftBackend",
     "chroot": "testinfra.backend.chroot.ChrootBackend",
+    "image": "testinfra.backend.image.ImageBackend",
 }
 
 
@@ -51,6 +52,9 @@ def parse_hostspec(hostspec: str) -> tuple[str, dict[str, Any]]:
         url = urllib.parse.urlparse(hostspec)
         kw["connection"] = url.scheme
         host = url.netloc
+        if url.scheme == "image":
+            # image:///path/to/image.tar
+            host += url.path
         query = urllib.parse.parse_qs(url.query)
         for key in ("sudo", "ssl", "no_ssl", "no_verify_ssl", "force_ansible"):
             if query.get(key, ["false"])[0].lower() == "true":
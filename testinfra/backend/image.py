@@ -0,0 +1,242 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import posixpath
+import tarfile
+from typing import IO, Any, Optional
+
+from testinfra.backend import base
+
+WHITEOUT_PREFIX = ".wh."
+WHITEOUT_OPAQUE = ".wh..wh..opq"
+
+Entry = tuple[tarfile.TarFile, tarfile.TarInfo]
+
+
+def _normpath(path: str) -> str:
+    # Absolute normalized path, ".." cannot escape the root
+    path = posixpath.normpath("/" + path)
+    return "/" + path.lstrip("/")
+
+
+def _split(path: str) -> list[str]:
+    return [part for part in _normpath(path).split("/") if part]
+
+
+class ImageBackend(base.BaseBackend):
+    """Inspect a container image without running it
+
+    The image is either a tarball created by ``docker save`` or
+    ``podman save`` (docker or OCI archive) or an OCI image layout
+    directory. Layers are merged into a read-only view of the image
+    filesystem, nothing is extracted nor executed.
+
+    Commands cannot be run, only the following modules are supported and
+    read the image files directly: file, group, package (dpkg, apk and
+    sqlite rpm databases), system_info and user.
+
+    Can be invoked by --hosts=image:///path/to/image.tar
+    """
+
+    NAME = "image"
+
+    def __init__(self, name: str, *args: Any, **kwargs: Any):
+        self.name = name
+        self._archive: Optional[tarfile.TarFile] = None
+        self._archive_names: dict[str, str] = {}
+        self._files: Optional[dict[str, Entry]] = None
+        self._children: dict[str, set[str]] = {}
+        self._config: dict[str, Any] = {}
+        self._getent: dict[str, list[list[str]]] = {}
+        super().__init__(self.name, *args, **kwargs)
+
+    def get_encoding(self) -> str:
+        return "utf-8"
+
+    def run(self, command: str, *args: str, **kwargs: Any) -> base.CommandResult:
+        raise RuntimeError(
+            "Cannot run commands with the image backend: " + self.quote(command, *args)
+        )
+
+    def _open_blob(self, name: str) -> IO[bytes]:
+        if self._archive is None:
+            return open(os.path.join(self.name, name), "rb")
+        try:
+            member = self._archive_names[_normpath(name)]
+        except KeyError:
+            raise RuntimeError(f"{name} not found in image {self.name}") from None
+        f = self._archive.extractfile(member)
+        assert f is not None
+        return f
+
+    def _load_json(self, name: str) -> Any:
+        with self._open_blob(name) as f:
+            return json.load(f)
+
+    def _get_layers(self) -> list[str]:
+        # Return the layers blob names, from the lowest to the uppermost
+        if self._archive is None:
+            has_manifest = os.path.exists(os.path.join(self.name, "manifest.json"))
+        else:
+            has_manifest = "/manifest.json" in self._archive_names
+        if has_manifest:
+            # docker save format (also written along the OCI layout by
+            # recent docker versions)
+            manifest = self._load_json("manifest.json")[0]
+            self._config = self._load_json(manifest["Config"])
+            return list(manifest["Layers"])
+        # OCI image layout, follow the first manifest of nested indexes
+        index = self._load_json("index.json")
+        while "manifests" in index:
+            digest = index["manifests"][0]["digest"]
+            index = self._load_json("blobs/" + digest.replace(":", "/", 1))
+        self._config = self._load_json(
+            "blobs/" + index["config"]["digest"].replace(":", "/", 1)
+        )
+        return [
+            "blobs/" + layer["digest"].replace(":", "/", 1) for layer in index["layers"]
+        ]
+
+    @staticmethod
+    def _remove(files: dict[str, Entry], path: str, children_only: bool) -> None:
+        prefix = path.rstrip("/") + "/"
+        for p in [p for p in files if p.startswith(prefix)]:
+            del files[p]
+        if not children_only:
+            files.pop(path, None)
+
+    @property
+    def files(self) -> dict[str, Entry]:
+        """Merged view of the image files: path -> (layer, member)"""
+        if self._files is not None:
+            return self._files
+        # Archives stay open to read files content later
+        if not os.path.isdir(self.name):
+            self._archive = tarfile.open(self.name, "r:*")  # noqa: SIM115
+            self._archive_names = {
+                _normpath(name): name for name in self._archive.getnames()
+            }
+        files: dict[str, Entry] = {}
+        for name in self._get_layers():
+            layer = tarfile.open(fileobj=self._open_blob(name), mode="r:*")  # noqa: SIM115
+            members = layer.getmembers()
+            # Whiteouts hide files of lower layers only, apply them first
+            for member in members:
+                dirname, basename = posixpath.split(_normpath(member.name))
+                if basename == WHITEOUT_OPAQUE:
+                    self._remove(files, dirname, True)
+                elif basename.startswith(WHITEOUT_PREFIX):
+                    path = posixpath.join(dirname, basename[len(WHITEOUT_PREFIX) :])
+                    self._remove(files, path, False)
+            for member in members:
+                path = _normpath(member.name)
+                if posixpath.basename(path).startswith(WHITEOUT_PREFIX):
+                    continue
+                if path in files and files[path][1].isdir() and not member.isdir():
+                    self._remove(files, path, True)
+                files[path] = (layer, member)
+        # Parent directories are not always in the layers
+        children: dict[str, set[str]] = {"/": set()}
+        for path in files:
+            while path != "/":
+                parent, name = posixpath.split(path)
+                children.setdefault(parent, set()).add(name)
+                path = parent
+        self._files = files
+        self._children = children
+        return files
+
+    @property
+    def config(self) -> dict[str, Any]:
+        """Image configuration (architecture, os, config, ...)"""
+        self.files  # noqa: B018
+        return self._config
+
+    def lookup(
+        self, path: str, follow_symlinks: bool = True
+    ) -> Optional[tuple[str, Optional[tarfile.TarInfo]]]:
+        """Resolve the path in the image
+
+        Return (resolved path, member) or None if the path does not exist.
+        The member is None for directories missing from the layers.
+        """
+        files = self.files
+        parts = _split(path)
+        resolved = "/"
+        links = 0
+        while parts:
+            current = posixpath.join(resolved, parts.pop(0))
+            entry = files.get(current)
+            if entry is None:
+                if current not in self._children:
+                    return None
+                resolved = current
+                continue
+            member = entry[1]
+            if member.issym() and (parts or follow_symlinks):
+                links += 1
+                if links > 40:
+                    return None
+                parts = _split(posixpath.join(resolved, member.linkname)) + parts
+                resolved = "/"
+            elif member.islnk():
+                # Hard links targets are relative to the image root
+                parts = _split(member.linkname) + parts
+                resolved = "/"
+            else:
+                resolved = current
+        entry = files.get(resolved)
+        return resolved, None if entry is None else entry[1]
+
+    def open(self, path: str) -> IO[bytes]:
+        """Open a regular file of the image"""
+        entry = self.lookup(path)
+        if entry is None:
+            raise FileNotFoundError(path)
+        resolved, member = entry
+        if member is None or not member.isfile():
+            raise IsADirectoryError(path)
+        f = self.files[resolved][0].extractfile(member)
+        assert f is not None
+        return f
+
+    def read(self, path: str) -> bytes:
+        """Return the content of a regular file of the image"""
+        with self.open(path) as f:
+            return f.read()
+
+    def listdir(self, path: str) -> list[str]:
+        """Return the sorted names of the entries of a directory of the image"""
+        entry = self.lookup(path)
+        if entry is None:
+            raise FileNotFoundError(path)
+        resolved, member = entry
+        if member is not None and not member.isdir():
+            raise NotADirectoryError(path)
+        return sorted(self._children.get(resolved, ()))
+
+    def getent(self, database: str) -> list[list[str]]:
+        """Return the entries of /etc/<database> (e.g. passwd) split on colons"""
+        if database not in self._getent:
+            try:
+                content = self.decode(self.read(f"/etc/{database}"))
+            except (FileNotFoundError, IsADirectoryError):
+                content = ""
+            self._getent[database] = [
+                line.split(":")
+                for line in content.splitlines()
+                # skip comments and NIS compat entries
+                if line and not line.startswith(("#", "+", "-"))
+            ]
+        return self._getent[database]
@@ -11,9 +11,11 @@
 # limitations under the License.
 
 import functools
+import math
 import os
-from collections.abc import Iterable
-from typing import Any
+import time
+from collections.abc import Iterable, Iterator
+from typing import Any, Callable, Optional, Union
 
 import testinfra.backend
 import testinfra.backend.base
@@ -130,6 +132,147 @@ class Host:
         assert out.rc == 0, f"Unexpected exit code {out.rc} for {out}"
         return out.stdout.rstrip("\r\n")
 
+    def iter_output(
+        self, command: str, *args: str, chunk_lines: int = 10000
+    ) -> Iterator[str]:
+        """Iterate on stdout lines of a command which has run successfully
+
+        The output is spooled to a temporary file on the host then read by
+        chunks of ``chunk_lines`` lines, so that memory usage stays bounded
+        even for huge outputs (e.g. ``getent passwd`` with a large LDAP
+        directory):
+
+        >>> for line in host.iter_output("getent passwd"):
+        ...     name = line.split(":")[0]
+
+        The temporary file is removed when the iteration ends or when the
+        iterator is closed. An iterator which is not consumed until the end
+        should be closed explicitly, otherwise the file is only removed when
+        the iterator is garbage collected (and not at all when the
+        interpreter exits):
+
+        >>> with contextlib.closing(host.iter_output("getent passwd")) as lines:
+        ...     first = next(lines)
+
+        :raises: AssertionError
+        """
+        __tracebackhide__ = True
+        command = self.backend.quote(command, *args)
+        path = self.check_output(
+            f'f=$(mktemp) || exit 1; ( {command} ) >"$f" '
+            '|| { r=$?; rm -f "$f"; exit $r; }; echo "$f"'
+        )
+        try:
+            # Byte offset (starting at 1) of the next chunk, tail seeks to it
+            # instead of reading the file from the start
+            offset = 1
+            while True:
+                out = self.run(
+                    "tail -c +%s %s | head -n %s", str(offset), path, str(chunk_lines)
+                )
+                assert out.rc == 0, f"Unexpected exit code {out.rc} for {out}"
+                lines = out.stdout.splitlines()
+                yield from lines
+                if len(lines) < chunk_lines:
+                    break
+                offset += len(out.stdout_bytes)
+        finally:
+            self.run("rm -f %s", path)
+
+    def wait_for(
+        self,
+        predicate: Union[Callable[[], Any], testinfra.modules.base.Module],
+        timeout: float = 30,
+        interval: float = 0.1,
+        max_interval: float = 2,
+        *,
+        attribute: Optional[str] = None,
+    ) -> float:
+        """Wait until a condition holds and return the time it took in seconds
+
+        The condition is either a callable or a module instance and the name
+        of one of its boolean attributes:
+
+        >>> host.wait_for(lambda: len(host.process.filter(comm="nginx")) > 2)
+        2.3
+        >>> host.wait_for(host.file("/run/nginx.pid"), attribute="exists")
+        0.42
+        >>> host.wait_for(host.socket("tcp://0.0.0.0:80"), attribute="is_listening")
+        1.05
+        >>> host.wait_for(host.service("nginx"), 60, attribute="is_running")
+        0.31
+
+        The condition is checked again after ``interval`` seconds, doubled
+        after each check up to ``max_interval`` seconds.
+
+        For well-known attributes (``exists`` and other file tests,
+        ``Socket.is_listening`` with ``ss`` and ``Service.is_running``), the
+        polling loop runs on the host in a single command and waiting for a
+        file uses ``inotifywait`` when available.
+
+        :raises: RuntimeError if the condition doesn't hold after ``timeout``
+                 seconds
+        """
+        start = time.monotonic()
+        if attribute is None:
+            what = repr(predicate)
+            condition = None
+        else:
+            assert isinstance(predicate, testinfra.modules.base.Module)
+            what = f"{predicate!r}.{attribute}"
+            condition = predicate._get_wait_condition(attribute)
+        if condition is not None:
+            command, watch = condition
+            script = self._get_wait_script(
+                command, watch, timeout, interval, max_interval
+            )
+            if self.run_test(script).rc != 0:
+                raise RuntimeError(f"{what} is still false after {timeout} seconds")
+            return time.monotonic() - start
+
+        if attribute is None:
+            check = predicate
+        else:
+            check = functools.partial(getattr, predicate, attribute)
+        while not check():  # type: ignore[operator]
+            elapsed = time.monotonic() - start
+            if elapsed >= timeout:
+                raise RuntimeError(f"{what} is still false after {timeout} seconds")
+            time.sleep(min(interval, timeout - elapsed))
+            interval = min(interval * 2, max_interval)
+        return time.monotonic() - start
+
+    def _get_wait_script(
+        self,
+        condition: str,
+        watch: Optional[str],
+        timeout: float,
+        interval: float,
+        max_interval: float,
+    ) -> str:
+        # Poll until condition holds, exit 1 on timeout
+        script = (
+            f"t={interval}; end=$(($(date +%s) + {math.ceil(timeout)})); "
+            f"until {condition}; do "
+            '[ "$(date +%s)" -ge "$end" ] && exit 1; '
+        )
+        if watch is not None:
+            # inotifywait exit 2 on timeout and 1 on error (e.g. watch does
+            # not exist)
+            script += (
+                "if command -v inotifywait >/dev/null 2>&1; then "
+                f"inotifywait -qq -t {max(1, math.ceil(max_interval))} "
+                "-e create -e moved_to -e attrib -e delete "
+                f"{self.backend.quote('%s', watch)} >/dev/null 2>&1; "
+                '[ $? -eq 1 ] && sleep "$t"; else sleep "$t"; fi; '
+            )
+        else:
+            script += 'sleep "$t"; '
+        return script + (
+            f't=$(awk "BEGIN {{ t = $t * 2; if (t > {max_interval}) '
+            f't = {max_interval}; print t }}"); done'
+        )
+
     def __getattr__(self, name: str) -> type[testinfra.modules.base.Module]:
         if name in testinfra.modules.modules:
             module_class = testinfra.modules.get_module_class(name)
@@ -10,8 +10,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
+import time
+
 from testinfra.modules.base import Module
 
+# Print the current time in nanoseconds, with a second precision if date
+# does not support %N (e.g. busybox)
+_NOW_FUNCTION = (
+    'now() { t=$(date +%s%N 2>/dev/null); case "$t" in *N|"") '
+    't=$(($(date +%s) * 1000000000));; esac; echo "$t"; }; '
+)
+
 
 class _AddrPort:
     def __init__(self, addr, port):
@@ -78,6 +88,9 @@ class Addr(Module):
     .. _ip-netns: https://man7.org/linux/man-pages/man8/ip-netns.8.html
     """
 
+    _resolve_cache = None
+    _resolve_methods = {None: "ahosts", "inet": "ahostsv4", "inet6": "ahostsv6"}
+
     def __init__(self, name, namespace=None):
         self._name = name
         self._namespace = namespace
@@ -117,6 +130,11 @@ class Addr(Module):
     @property
     def is_resolvable(self):
         """Return if address is resolvable"""
+        if not self._get_cached("ahosts"):
+            # Addresses of a single family cached by resolve_many()
+            for method in ("ahostsv4", "ahostsv6"):
+                if self._get_cached(method):
+                    return True
         return len(self.ip_addresses) > 0
 
     @property
@@ -146,10 +164,140 @@ class Addr(Module):
         """Return address-port pair"""
         return _AddrPort(self, port)
 
+    @classmethod
+    def reachability(cls, targets, ports, timeout=1, namespace=None):
+        """Probe all (target, port) pairs concurrently
+
+        All probes run in background in a single command on the host, so
+        that unreachable endpoints cost ``timeout`` once instead of once per
+        endpoint. A port ``None`` probes the target with ``ping`` like
+        :attr:`is_reachable`, other ports are probed like
+        ``port(port).is_reachable``.
+
+        Return a dict of (target, port) to a dict with ``reachable`` and
+        ``latency``, the time to connect (or the ping round trip including
+        the command startup) in seconds or ``None`` if unreachable:
+
+        >>> host.addr.reachability(["10.0.0.1", "db"], [None, 5432])
+        {('10.0.0.1', None): {'reachable': True, 'latency': 0.004},
+         ('10.0.0.1', 5432): {'reachable': False, 'latency': None},
+         ('db', None): {'reachable': True, 'latency': 0.003},
+         ('db', 5432): {'reachable': True, 'latency': 0.002}}
+
+        Latencies have a second precision when ``date`` does not support
+        nanoseconds (e.g. busybox).
+        """
+        prefix = cls(None, namespace)._prefix
+        has_nc = cls._host.exists("nc")
+        if not has_nc and namespace:
+            raise NotImplementedError(
+                "nc command not available, namespace cannot be used"
+            )
+        quote = cls._host.backend.quote
+        wait = str(max(1, math.ceil(timeout)))
+        pairs = [(target, port) for target in targets for port in ports]
+        script = _NOW_FUNCTION
+        for i, (target, port) in enumerate(pairs):
+            if port is None:
+                probe = quote(f"{prefix}ping -W %s -c 1 %s", wait, target)
+            elif has_nc:
+                probe = quote(f"{prefix}nc -w %s -z %s %s", wait, target, str(port))
+            else:
+                # Fallback to bash if netcat is not available
+                probe = quote(
+                    "timeout %s bash -c %s",
+                    str(timeout),
+                    quote("cat < /dev/null > /dev/tcp/%s/%s", target, str(port)),
+                )
+            script += (
+                f'(s=$(now); {probe} >/dev/null 2>&1; r=$?; echo "{i} $r $s $(now)") & '
+            )
+        results = {}
+        for line in cls.check_output(script + "wait").splitlines():
+            i, rc, start, end = line.split()
+            reachable = rc == "0"
+            results[pairs[int(i)]] = {
+                "reachable": reachable,
+                "latency": (int(end) - int(start)) / 1e9 if reachable else None,
+            }
+        return {pair: results[pair] for pair in pairs}
+
+    @classmethod
+    def resolve_many(cls, names, family=None, namespace=None, ttl=60):
+        """Resolve names with a single command
+
+        ``family`` is None (any), ``inet`` or ``inet6``. Return a dict of
+        name to a dict with ``addresses`` (empty if the name cannot be
+        resolved) and ``latency``, the resolution time in seconds, so that
+        slow resolvers are visible:
+
+        >>> host.addr.resolve_many(["db", "cache"], family="inet")
+        {'db': {'addresses': ['10.0.0.12'], 'latency': 0.002},
+         'cache': {'addresses': [], 'latency': 5.01}}
+
+        Results are cached for ``ttl`` seconds and used instead of running
+        ``getent`` again: with ``family=None`` by ``is_resolvable`` and
+        ``ip_addresses``, with ``inet`` by ``ipv4_addresses`` and with
+        ``inet6`` by ``ipv6_addresses``. ``is_resolvable`` also uses names
+        resolved to at least one address of either family. Use
+        ``clear_cache()`` to drop it.
+
+        Latencies have a second precision when ``date`` does not support
+        nanoseconds (e.g. busybox).
+        """
+        method = cls._resolve_methods[family]
+        prefix = cls(None, namespace)._prefix
+        quote = cls._host.backend.quote
+        names = list(dict.fromkeys(names))
+        script = _NOW_FUNCTION + "for n in"
+        for name in names:
+            script += quote(" %s", name)
+        script += (
+            f'; do s=$(now); o=$({prefix}getent {method} "$n"); '
+            'echo "== $n $s $(now)"; [ -n "$o" ] && echo "$o"; done; true'
+        )
+        results = {}
+        addresses = []
+        for line in cls.check_output(script).splitlines():
+            if line.startswith("== "):
+                name, start, end = line[3:].rsplit(" ", 2)
+                addresses = []
+                results[name] = {
+                    "addresses": addresses,
+                    "latency": (int(end) - int(start)) / 1e9,
+                }
+            elif line and line.split()[0] not in addresses:
+                addresses.append(line.split()[0])
+        if cls._resolve_cache is None:
+            cls._resolve_cache = {}
+        expires = time.monotonic() + ttl
+        for name, result in results.items():
+            cls._resolve_cache[(namespace, method, name)] = (
+                expires,
+                result["addresses"],
+            )
+        return {name: results[name] for name in names}
+
+    @classmethod
+    def clear_cache(cls):
+        """Drop the cache filled by :meth:`resolve_many`"""
+        cls._resolve_cache = None
+
     def __repr__(self):
         return f"<addr {self.name}>"
 
+    def _get_cached(self, method):
+        # Return the addresses cached by resolve_many() or None
+        if self._resolve_cache is not None:
+            cached = self._resolve_cache.get((self.namespace, method, self.name))
+            if cached is not None and cached[0] > time.monotonic():
+                return list(cached[1])
+        return None
+
     def _resolve(self, method):
+        cached = self._get_cached(method)
+        if cached is not None:
+            return cached
         result = self.run_expect(
             [0, 1, 2], f"{self._prefix}getent {method} {self.name}"
         )
@@ -9,7 +9,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 
 class Module:
@@ -18,6 +18,8 @@ class Module:
 
         _host: testinfra.host.Host
 
+    _snapshot: Any = None
+
     @classmethod
     def get_module(cls, _host: "testinfra.host.Host") -> type["Module"]:
         klass = cls.get_module_class(_host)
@@ -47,10 +49,55 @@ class Module:
     def check_output(cls, *args, **kwargs):
         return cls._host.check_output(*args, **kwargs)
 
+    @classmethod
+    def iter_output(cls, *args, **kwargs):
+        return cls._host.iter_output(*args, **kwargs)
+
     @classmethod
     def find_command(cls, *args, **kwargs):
         return cls._host.find_command(*args, **kwargs)
 
+    @classmethod
+    def snapshot(cls):
+        """Take a snapshot of the host state checked by the module
+
+        After a snapshot, the module answers from it instead of running
+        commands for each checked object. The snapshot is not updated when
+        the host changes, take it again or call :meth:`clear_snapshot` to
+        query the host directly again.
+
+        Raise ``NotImplementedError`` if the module doesn't support
+        snapshots.
+        """
+        cls._snapshot = cls._get_snapshot()
+
+    @classmethod
+    def clear_snapshot(cls):
+        """Drop the snapshot taken by :meth:`snapshot`"""
+        cls._snapshot = None
+
+    @classmethod
+    def _get_snapshot(cls):
+        # Return the snapshot data, overridden by modules supporting snapshots
+        raise NotImplementedError
+
+    @classmethod
+    def _get_current_snapshot(cls):
+        # Return the snapshot, or a temporary one which is not stored for
+        # bulk queries (e.g. listing all objects)
+        if cls._snapshot is not None:
+            return cls._snapshot
+        return cls._get_snapshot()
+
+    def _get_wait_condition(self, attribute):
+        """Return a shell condition equivalent to the given attribute
+
+        Used by ``host.wait_for()`` to poll on the host side. Return a tuple
+        (condition, path) where path is a directory to watch with inotifywait
+        (or None) or return None if the attribute is not supported.
+        """
+        return None
+
 
 class InstanceModule(Module):
     @classmethod
@@ -11,9 +11,35 @@
 # limitations under the License.
 
 import functools
+import json
+import posixpath
 
 from testinfra.modules.base import Module
 
+# Block devices (lsblk skips empty ones, e.g. detached loop devices), the
+# soft block size which is only known by blockdev and the queue depth of
+# devices that have one (SCSI)
+_DEVICES_SCRIPT = (
+    "lsblk --json --bytes --paths -O {options} || exit 1; echo ==; "
+    "{blockdev}; echo ==; "
+    "grep -H . /sys/block/*/device/queue_depth 2>/dev/null; true"
+)
+
+
+def _iter_lsblk(devices):
+    for device in devices:
+        yield device
+        yield from _iter_lsblk(device.get("children", []))
+
+
+def _lsblk_bool(value):
+    # lsblk before util-linux 2.33 outputs all values as strings
+    return value in (True, "1")
+
+
+def _lsblk_int(value):
+    return None if value is None else int(value)
+
 
 class BlockDevice(Module):
     """Information for a block device.
@@ -21,16 +47,43 @@ class BlockDevice(Module):
     Should be used with sudo or under root.
 
     If the device is not a block device, RuntimeError is raised.
+
+    With a snapshot of all block devices (see :ref:`snapshots`), the
+    properties of block devices are answered without running ``blockdev``
+    or ``lsblk`` for each device:
+
+    >>> host.block_device.snapshot()
+    >>> for device in host.block_device.get_block_devices():
+    ...     if not device.is_partition and device.is_rotational:
+    ...         assert device.scheduler == "mq-deadline"
+
+    On Linux the snapshot runs ``lsblk --json``, ``blockdev --report``
+    and reads queue depths from ``/sys/block`` in a single command.
+    Devices are looked up by their path as reported by ``lsblk``
+    (e.g. ``/dev/sda1`` or ``/dev/mapper/vg-root``), other paths and
+    empty devices are queried directly.
     """
 
     @property
     def _data(self):
         raise NotImplementedError
 
+    @property
+    def _queue(self):
+        raise NotImplementedError
+
     def __init__(self, device):
         self.device = device
         super().__init__()
 
+    def _get_start_sector(self):
+        # Missing from a snapshot when lsblk is too old to report it and
+        # blockdev does not report the device
+        start_sector = self._data["start_sector"]
+        if start_sector is None:
+            raise RuntimeError(f"Failed to gather start sector of {self.device}")
+        return start_sector
+
     @property
     def is_partition(self):
         """Return True if the device is a partition.
@@ -43,7 +96,7 @@ class BlockDevice(Module):
 
 
         """
-        return self._data["start_sector"] > 0
+        return self._get_start_sector() > 0
 
     @property
     def size(self):
@@ -71,7 +124,11 @@ class BlockDevice(Module):
         >>> host.block_device("/dev/sda").block_size
         4096
         """
-        return self._data["block_size"]
+        block_size = self._data["block_size"]
+        if block_size is None:
+            # Missing from a snapshot when blockdev does not report the device
+            raise RuntimeError(f"Failed to gather block size of {self.device}")
+        return block_size
 
     @property
     def start_sector(self):
@@ -114,6 +171,60 @@ class BlockDevice(Module):
         """
         return self._data["read_ahead"]
 
+    @property
+    def scheduler(self):
+        """Return the active I/O scheduler of the device
+
+        Partitions use the scheduler of their disk. None for devices without
+        a request queue (e.g. zram).
+
+        >>> host.block_device("/dev/sda").scheduler
+        'mq-deadline'
+        >>> host.block_device("/dev/nvme0n1").scheduler
+        'none'
+        """
+        return self._queue["scheduler"]
+
+    @property
+    def is_rotational(self):
+        """Return True if the device is rotational (e.g. a hard disk drive)
+
+        >>> host.block_device("/dev/sda").is_rotational
+        True
+        >>> host.block_device("/dev/nvme0n1").is_rotational
+        False
+        """
+        return self._queue["is_rotational"]
+
+    @property
+    def nr_requests(self):
+        """Return the size of the request queue of the device
+
+        >>> host.block_device("/dev/sda").nr_requests
+        256
+        """
+        return self._queue["nr_requests"]
+
+    @property
+    def queue_depth(self):
+        """Return the queue depth of the device or None if it has none
+
+        Only SCSI devices (and partitions of them) have a queue depth.
+
+        >>> host.block_device("/dev/sda").queue_depth
+        32
+        """
+        return self._queue["queue_depth"]
+
+    @classmethod
+    def get_block_devices(cls):
+        """Returns a list of BlockDevice instances
+
+        >>> host.block_device.get_block_devices()
+        [<BlockDevice(path=/dev/sda)>, <BlockDevice(path=/dev/sda1)>]
+        """
+        return [cls(device) for device in cls._get_current_snapshot()]
+
     @classmethod
     def get_module_class(cls, host):
         if host.system_info.type == "linux":
@@ -125,8 +236,85 @@ class BlockDevice(Module):
 
 
 class LinuxBlockDevice(BlockDevice):
+    @classmethod
+    def _get_devices(cls, device=None):
+        if device is None:
+            options = ""
+            blockdev = "blockdev --report 2>/dev/null"
+        else:
+            options = cls._host.backend.quote("--nodeps %s", device)
+            blockdev = "true"
+        out = cls.run(_DEVICES_SCRIPT.format(options=options, blockdev=blockdev))
+        if out.rc != 0:
+            raise RuntimeError(f"Failed to gather data: {out.stderr}")
+        sections = [[]]
+        for line in out.stdout.splitlines():
+            if line == "==":
+                sections.append([])
+            else:
+                sections[-1].append(line)
+        lsblk, blockdev, queue_depths = sections
+
+        # path -> (block size, start sector)
+        reports = {}
+        for line in blockdev[1:]:
+            fields = line.split()
+            if len(fields) == 7:
+                reports[fields[6]] = (int(fields[3]), int(fields[4]))
+        depths = {}
+        for line in queue_depths:
+            path, value = line.rsplit(":", 1)
+            depths[path.split("/")[3]] = int(value)
+
+        devices = {}
+        for data in _iter_lsblk(json.loads("\n".join(lsblk))["blockdevices"]):
+            path = data.get("path") or data["name"]
+            is_part = data["type"] == "part"
+            # Partitions use the queue of their disk
+            disk = data["pkname"] if is_part else data["kname"]
+            # blockdev names devices from /proc/partitions (e.g. /dev/dm-0
+            # for /dev/mapper/vg-root), which is the kernel name
+            block_size, start_sector = reports.get(
+                path, reports.get(data["kname"], (None, None))
+            )
+            if "start" in data:
+                # Added in util-linux 2.35, null for devices other than
+                # partitions
+                start_sector = int(data["start"] or 0)
+            elif not is_part:
+                start_sector = 0
+            devices[path] = {
+                "rw_mode": "ro" if _lsblk_bool(data["ro"]) else "rw",
+                # lsblk read ahead is in KiB, blockdev in 512-bytes sectors
+                "read_ahead": int(data["ra"]) * 2,
+                "sector_size": int(data["log-sec"]),
+                "block_size": block_size,
+                "start_sector": start_sector,
+                "size": int(data["size"]),
+                "scheduler": data.get("sched"),
+                "is_rotational": _lsblk_bool(data["rota"]),
+                "nr_requests": _lsblk_int(data.get("rq-size")),
+                "queue_depth": depths.get(posixpath.basename(disk or "")),
+            }
+        return devices
+
+    @classmethod
+    def _get_snapshot(cls):
+        return cls._get_devices()
+
+    @functools.cached_property
+    def _queue(self):
+        if self._snapshot is not None and self.device in self._snapshot:
+            return self._snapshot[self.device]
+        devices = self._get_devices(self.device)
+        if len(devices) != 1:
+            raise RuntimeError(f"No data from {self.device}")
+        return next(iter(devices.values()))
+
     @functools.cached_property
     def _data(self):
+        if self._snapshot is not None and self.device in self._snapshot:
+            return self._snapshot[self.device]
         header = ["RO", "RA", "SSZ", "BSZ", "StartSec", "Size", "Device"]
         command = "blockdev  --report %s"
         blockdev = self.run(command, self.device)
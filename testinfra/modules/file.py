@@ -10,13 +10,161 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import datetime
+import hashlib
+import logging
+import os
+import posixpath
+import re
+from typing import Optional
 
 from testinfra.modules.base import Module
 
+logger = logging.getLogger("testinfra")
+
+
+_CHECKSUM_ESCAPES = {"\\": "\\", "n": "\n", "r": "\r"}
+
+
+def _unescape_checksum(match):
+    try:
+        return _CHECKSUM_ESCAPES[match.group(1)]
+    except KeyError:
+        raise ValueError(f"Invalid escape sequence: {match.group()!r}") from None
+
+
+def _parse_checksum_line(line):
+    # Parse a line in the md5sum/sha256sum output format:
+    # <digest>  <path> (or <digest> *<path> for binary mode), the line is
+    # prefixed by a backslash when backslashes and newlines of the path are
+    # escaped
+    escaped = line.startswith("\\")
+    if escaped:
+        line = line[1:]
+    digest, path = line.split(" ", 1)
+    path = path[1:]
+    if escaped:
+        path = re.sub(r"\\(.?)", _unescape_checksum, path)
+    return digest, path
+
+
+def _read_manifest(filename):
+    # Parse a local file in the md5sum/sha256sum output format
+    manifest = {}
+    with open(filename) as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            digest, path = _parse_checksum_line(line)
+            manifest[path] = digest.lower()
+    return manifest
+
+
+# Usage: awk _SEARCH_SCRIPT <number of patterns> <patterns...> <files...>
+# Patterns are removed from ARGV so they are not read as files.
+_SEARCH_SCRIPT = """
+BEGIN {
+    n = ARGV[1]
+    ARGV[1] = ""
+    for (i = 1; i <= n; i++) {
+        pattern[i] = ARGV[i + 1]
+        ARGV[i + 1] = ""
+    }
+}
+{
+    for (i = 1; i <= n; i++) {
+        if ($0 ~ pattern[i]) {
+            print i, FNR, FILENAME
+        }
+    }
+}
+"""
+
+
+def _local_sha256sum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _chunks(paths, max_size=65536):
+    # A command is passed as a single argument to "sh -c" which is limited
+    # to 128KiB on Linux, split paths in chunks to stay below.
+    chunk = []
+    size = 0
+    for path in paths:
+        if chunk and size + len(path) > max_size:
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(path)
+        size += len(path) + 3
+    if chunk:
+        yield chunk
+
+
+def _parallel_command(command, paths):
+    # Run command on each path, in parallel across the host CPUs. Each
+    # command output a single line, which is written atomically.
+    return (
+        "printf '%%s\\0' "
+        + " ".join(["%s"] * len(paths))
+        + " | xargs -0 -n 1 -P $(getconf _NPROCESSORS_ONLN 2>/dev/null || echo 1) "
+        + command
+    )
+
+
+class _ContentCache:
+    # LRU cache of file contents, bounded by the total size of contents
+    def __init__(self):
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        entry = self.entries.get(path)
+        if entry is not None:
+            self.entries.move_to_end(path)
+        return entry
+
+    def set(self, path, signature, content, max_size):
+        self.pop(path)
+        if len(content) > max_size:
+            return
+        self.entries[path] = (signature, content)
+        self.size += len(content)
+        while self.size > max_size:
+            _, (_, old) = self.entries.popitem(last=False)
+            self.size -= len(old)
+
+    def pop(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
 
 class File(Module):
-    """Test various files attributes"""
+    """Test various files attributes
+
+    File contents can be cached per host, a cached content is only reused
+    after checking that the file inode, size and modification time didn't
+    change. The cache is disabled by default, set ``content_cache_size`` to
+    the maximum total size of cached contents in bytes to enable it:
+
+    >>> host.file.content_cache_size = 16 * 1024 * 1024
+
+    Only non-empty regular files are cached, files of pseudo filesystems
+    like ``/proc`` and ``/sys`` report a zero size and are always read.
+    """
+
+    content_cache_size = 0
+    _content_cache: Optional[_ContentCache] = None
+    _stat_signature: Optional[str] = None
 
     def __init__(self, path):
         self.path = path
@@ -134,6 +282,81 @@ class File(Module):
         """
         return self.run_test("grep -qs -- %s %s", pattern, self.path).rc == 0
 
+    _wait_tests = {
+        "exists": "-e",
+        "is_file": "-f",
+        "is_directory": "-d",
+        "is_executable": "-x",
+        "is_pipe": "-p",
+        "is_socket": "-S",
+        "is_symlink": "-L",
+    }
+
+    def _get_wait_condition(self, attribute):
+        if attribute not in self._wait_tests:
+            return None
+        return (
+            self._host.backend.quote(
+                f"test {self._wait_tests[attribute]} %s", self.path
+            ),
+            posixpath.dirname(self.path) or ".",
+        )
+
+    def search(self, patterns):
+        """Search many patterns in the file content at once
+
+        Return a dict mapping each pattern to the list of line numbers
+        where it matches (an empty list if it doesn't match).
+
+        >>> host.file("/etc/ssh/sshd_config").search(
+        ...     ["^PermitRootLogin no", "^PasswordAuthentication no"])
+        {'^PermitRootLogin no': [32], '^PasswordAuthentication no': []}
+
+        The file is read once with awk and thus patterns follow the
+        extended regex syntax.
+        """
+        return self.search_files([self.path], patterns)[self.path]
+
+    @classmethod
+    def search_files(cls, paths, patterns):
+        """Search many patterns in many files at once
+
+        Like :meth:`search` with a single command for all files. Return a
+        dict mapping each path to the result of :meth:`search`, files which
+        cannot be read don't match any pattern.
+
+        >>> host.file.search_files(["/etc/hosts", "/etc/hostname"], ["^127"])
+        {'/etc/hosts': {'^127': [1, 2]}, '/etc/hostname': {'^127': []}}
+        """
+        paths = list(dict.fromkeys(paths))
+        patterns = list(patterns)
+        result = {path: {pattern: [] for pattern in patterns} for path in paths}
+        if not paths or not patterns:
+            return result
+        # awk takes "ident=value" operands as assignments and "-" as its
+        # standard input, so relative paths are given as ./path
+        operands = {
+            path if path.startswith("/") else f"./{path}": path for path in paths
+        }
+        # Only keep readable regular files, /dev/null is always given so awk
+        # never read its standard input.
+        out = cls.check_output(
+            "set --; for f in "
+            + " ".join(["%s"] * len(paths))
+            + '; do [ -f "$f" ] && [ -r "$f" ] && set -- "$@" "$f"; done; '
+            + "awk %s %s "
+            + " ".join(["%s"] * len(patterns))
+            + ' "$@" /dev/null',
+            *operands,
+            _SEARCH_SCRIPT,
+            str(len(patterns)),
+            *patterns,
+        )
+        for line in out.splitlines():
+            index, lineno, path = line.split(" ", 2)
+            result[operands[path]][patterns[int(index) - 1]].append(int(lineno))
+        return result
+
     @property
     def md5sum(self):
         """Compute the MD5 message digest of the file content"""
@@ -144,13 +367,189 @@ class File(Module):
         """Compute the SHA256 message digest of the file content"""
         raise NotImplementedError
 
+    @classmethod
+    def md5sums(cls, paths, manifest=None):
+        """Compute the MD5 message digest of many files at once
+
+        See :meth:`sha256sums`.
+        """
+        return cls._checksums("md5", paths, manifest)
+
+    @classmethod
+    def sha256sums(cls, paths, manifest=None):
+        """Compute the SHA256 message digest of many files at once
+
+        All files are hashed by a single command, in parallel across the
+        CPUs of the host. Return a dict mapping each path to its digest,
+        files which cannot be read map to ``None``.
+
+        >>> host.file.sha256sums(["/etc/passwd", "/nonexistent"])
+        {'/etc/passwd': 'a8b4...', '/nonexistent': None}
+
+        When a ``manifest`` is given, either as a dict mapping paths to
+        digests or as the path of a local file in the ``sha256sum`` output
+        format, the digests are computed for the paths of the manifest and
+        only the mismatching ones are returned.
+
+        >>> host.file.sha256sums(None, manifest="/srv/release/SHA256SUMS")
+        {'/srv/app/bin/app': 'e3b0...'}
+
+        :raises: ValueError if neither ``paths`` nor ``manifest`` is given
+        """
+        return cls._checksums("sha256", paths, manifest)
+
+    @classmethod
+    def _checksums(cls, algorithm, paths, manifest):
+        if paths is None and manifest is None:
+            raise ValueError("paths or manifest is required")
+        if isinstance(paths, str):
+            raise ValueError(f"paths must be a list of paths, not {paths!r}")
+        if manifest is not None and isinstance(manifest, str):
+            manifest = _read_manifest(manifest)
+        if paths is None:
+            paths = list(manifest)
+        checksums = {}
+        for chunk in _chunks(paths):
+            checksums.update(cls._get_checksums(algorithm, chunk))
+        if manifest is None:
+            return checksums
+        return {
+            path: digest
+            for path, digest in checksums.items()
+            if digest != manifest.get(path)
+        }
+
+    @classmethod
+    def _get_checksums(cls, algorithm, paths):
+        raise NotImplementedError
+
+    def matches_local(self, local_path):
+        """Test if the file has the same content than a local file
+
+        Sizes then SHA256 digests are compared, the content is never
+        transferred.
+
+        >>> host.file("/etc/nginx/nginx.conf").matches_local("files/nginx.conf")
+        True
+        """
+        if os.path.getsize(local_path) != self.size:
+            return False
+        return self.sha256sum == _local_sha256sum(local_path)
+
+    def differing_ranges(self, local_path, block_size=None):
+        """Return the byte ranges where the file differs from a local file
+
+        Both files are split in blocks of ``block_size`` bytes (by default
+        about a thousandth of the file size) and only the SHA256 digest of
+        each remote block is transferred. Return a list of ``(start, end)``
+        ranges, ``end`` being excluded.
+
+        >>> host.file("/srv/app.bin").differing_ranges("build/app.bin")
+        [(1048576, 2097152)]
+        """
+        size = self.size
+        local_size = os.path.getsize(local_path)
+        max_size = max(size, local_size)
+        if block_size is None:
+            block_size = 4096
+            while block_size * 1024 < max_size:
+                block_size *= 2
+        count = -(-size // block_size)
+        digests = self._get_block_digests(block_size, count)
+        ranges = []
+        with open(local_path, "rb") as f:
+            for index, start in enumerate(range(0, max_size, block_size)):
+                end = min(start + block_size, max_size)
+                block = f.read(block_size)
+                if (
+                    index < count
+                    and block
+                    and digests[index] == hashlib.sha256(block).hexdigest()
+                ):
+                    continue
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1] = (ranges[-1][0], end)
+                else:
+                    ranges.append((start, end))
+        return ranges
+
+    _sha256_stdin: Optional[str] = None
+
+    def _get_block_digests(self, block_size, count):
+        if self._sha256_stdin is None:
+            raise NotImplementedError
+        out = self.check_output(
+            "i=0; while [ $i -lt %s ]; do "
+            "dd if=%s bs=%s skip=$i count=1 2>/dev/null | "
+            + self._sha256_stdin
+            + "; i=$((i+1)); done",
+            str(count),
+            self.path,
+            str(block_size),
+        )
+        return [line.split()[0] for line in out.splitlines()]
+
     def _get_content(self, decode):
-        out = self.run_test("cat -- %s", self.path)
+        if self._stat_signature is None or not self.content_cache_size:
+            out = self.run_test("cat -- %s", self.path)
+            if out.rc != 0:
+                raise RuntimeError(f"Unexpected output {out}")
+            if decode:
+                return out.stdout
+            return out.stdout_bytes
+        content = self._get_cached_content()
+        if decode:
+            return self._host.backend.decode(content)
+        return content
+
+    def _get_cached_content(self):
+        cls = type(self)
+        if cls._content_cache is None:
+            cls._content_cache = _ContentCache()
+        cache = cls._content_cache
+        entry = cache.get(self.path)
+        # Output the file signature, followed by the content unless the
+        # signature match the cached one. Files which are not regular or
+        # empty (e.g. in /proc) get a "-" signature and are never cached.
+        out = self.run_test(
+            "sig=$("
+            + self._stat_signature
+            + " %s) && [ -r %s ] || exit 1; "
+            + '[ -f %s ] && [ -s %s ] || sig=-; echo "$sig"; '
+            + '[ "$sig" = %s ] || cat -- %s',
+            self.path,
+            self.path,
+            self.path,
+            self.path,
+            entry[0] if entry is not None else "",
+            self.path,
+        )
         if out.rc != 0:
+            cache.pop(self.path)
             raise RuntimeError(f"Unexpected output {out}")
-        if decode:
-            return out.stdout
-        return out.stdout_bytes
+        signature, content = out.stdout_bytes.split(b"\n", 1)
+        signature = signature.decode()
+        if entry is not None and signature == entry[0]:
+            cache.hits += 1
+            logger.debug(
+                "File content cache hit for %s (%d hits, %d misses)",
+                self.path,
+                cache.hits,
+                cache.misses,
+            )
+            return entry[1]
+        if signature == "-":
+            cache.pop(self.path)
+            return content
+        cache.misses += 1
+        logger.debug(
+            "File content cache miss for %s (%d hits, %d misses)",
+            self.path,
+            cache.hits,
+            cache.misses,
+        )
+        cache.set(self.path, signature, content, self.content_cache_size)
+        return content
 
     @property
     def content(self):
@@ -195,6 +594,21 @@ class File(Module):
             raise RuntimeError(f"Unexpected output {out}")
         return out.stdout.splitlines()
 
+    def iterdir(self):
+        """Iterate on items under the directory
+
+        Like :meth:`listdir` but ``ls`` output is read by chunks (see
+        :meth:`testinfra.host.Host.iter_output`), memory usage stays bounded
+        with huge directories.
+
+        >>> sum(1 for _ in host.file("/var/spool/mail").iterdir())
+        250000
+        """
+        try:
+            yield from self.iter_output("ls -1 -q -- %s", self.path)
+        except AssertionError as exc:
+            raise RuntimeError(f"Unexpected output {exc}") from None
+
     def __repr__(self):
         return f"<file {self.path}>"
 
@@ -207,6 +621,8 @@ class File(Module):
 
     @classmethod
     def get_module_class(cls, host):
+        if host.backend.get_connection_type() == "image":
+            return ImageFile
         if host.system_info.type == "linux":
             return GNUFile
         if host.system_info.type == "netbsd":
@@ -221,6 +637,9 @@ class File(Module):
 
 
 class GNUFile(File):
+    _sha256_stdin = "sha256sum"
+    _stat_signature = "stat -Lc '%%i %%s %%y' --"
+
     @property
     def user(self):
         return self.check_output("stat -Lc %%U %s", self.path)
@@ -264,6 +683,22 @@ class GNUFile(File):
     def sha256sum(self):
         return self.check_output("sha256sum %s | cut -d ' ' -f 1", self.path)
 
+    @classmethod
+    def _get_checksums(cls, algorithm, paths):
+        checksums = dict.fromkeys(paths)
+        if not paths:
+            return checksums
+        # xargs exit with 123 when one of the invocation fails
+        out = cls.run_expect(
+            [0, 123],
+            _parallel_command(f"{algorithm}sum --", paths),
+            *paths,
+        )
+        for line in out.stdout.splitlines():
+            digest, path = _parse_checksum_line(line)
+            checksums[path] = digest
+        return checksums
+
 
 class BSDFile(File):
     @property
@@ -305,6 +740,28 @@ class BSDFile(File):
     def sha256sum(self):
         return self.check_output("sha256 < %s", self.path)
 
+    _checksum_commands = {"md5": "md5", "sha256": "sha256"}
+    _sha256_stdin = "sha256"
+    # Sub-second modification time
+    _stat_signature = "stat -L -f '%%i %%z %%Fm'"
+
+    @classmethod
+    def _get_checksums(cls, algorithm, paths):
+        checksums = dict.fromkeys(paths)
+        if not paths:
+            return checksums
+        out = cls.run_expect(
+            [0, 123],
+            _parallel_command(cls._checksum_commands[algorithm], paths),
+            *paths,
+        )
+        for line in out.stdout.splitlines():
+            # SHA256 (<path>) = <digest>
+            head, digest = line.rsplit(" = ", 1)
+            path = head.split(" (", 1)[1][:-1]
+            checksums[path] = digest
+        return checksums
+
 
 class DarwinFile(BSDFile):
     @property
@@ -331,6 +788,9 @@ class NetBSDFile(BSDFile):
     def sha256sum(self):
         return self.check_output("cksum -a sha256 < %s", self.path)
 
+    _checksum_commands = {"md5": "cksum -a md5", "sha256": "cksum -a sha256"}
+    _sha256_stdin = "cksum -a sha256"
+
 
 class WindowsFile(File):
     @property
@@ -432,6 +892,13 @@ class WindowsFile(File):
             != ""
         )
 
+    @classmethod
+    def search_files(cls, paths, patterns):
+        raise NotImplementedError
+
+    def _get_wait_condition(self, attribute):
+        return None
+
     @property
     def md5sum(self):
         raise NotImplementedError
@@ -500,3 +967,175 @@ class WindowsFile(File):
             self.path,
         )
         return [item.strip() for item in out.strip().split("\n")]
+
+    def iterdir(self):
+        yield from self.listdir()
+
+
+class ImageFile(File):
+    """Files of a container image read with the image backend
+
+    Patterns of ``contains()`` and ``search()`` use the Python regex syntax.
+    """
+
+    def _lookup(self, follow_symlinks=True):
+        return self._host.backend.lookup(self.path, follow_symlinks)
+
+    def _stat(self):
+        entry = self._lookup()
+        if entry is None:
+            raise RuntimeError(f"No such file or directory: {self.path}")
+        return entry[1]
+
+    def _get_name(self, database, id_):
+        for fields in self._host.backend.getent(database):
+            if len(fields) > 2 and fields[2] == str(id_):
+                return fields[0]
+        return "UNKNOWN"
+
+    @property
+    def exists(self):
+        return self._lookup() is not None
+
+    @property
+    def is_file(self):
+        entry = self._lookup()
+        return entry is not None and entry[1] is not None and entry[1].isfile()
+
+    @property
+    def is_directory(self):
+        entry = self._lookup()
+        return entry is not None and (entry[1] is None or entry[1].isdir())
+
+    @property
+    def is_executable(self):
+        entry = self._lookup()
+        return entry is not None and (entry[1] is None or bool(entry[1].mode & 0o111))
+
+    @property
+    def is_pipe(self):
+        entry = self._lookup()
+        return entry is not None and entry[1] is not None and entry[1].isfifo()
+
+    @property
+    def is_socket(self):
+        # Sockets cannot be stored in layers
+        return False
+
+    @property
+    def is_symlink(self):
+        entry = self._lookup(follow_symlinks=False)
+        return entry is not None and entry[1] is not None and entry[1].issym()
+
+    @property
+    def linked_to(self):
+        entry = self._lookup()
+        if entry is None:
+            return posixpath.normpath(self.path)
+        return entry[0]
+
+    @property
+    def user(self):
+        member = self._stat()
+        if member is None:
+            return "root"
+        return member.uname or self._get_name("passwd", member.uid)
+
+    @property
+    def uid(self):
+        member = self._stat()
+        return 0 if member is None else member.uid
+
+    @property
+    def group(self):
+        member = self._stat()
+        if member is None:
+            return "root"
+        return member.gname or self._get_name("group", member.gid)
+
+    @property
+    def gid(self):
+        member = self._stat()
+        return 0 if member is None else member.gid
+
+    @property
+    def mode(self):
+        member = self._stat()
+        return 0o755 if member is None else member.mode & 0o7777
+
+    @property
+    def mtime(self):
+        member = self._stat()
+        return datetime.datetime.fromtimestamp(0 if member is None else member.mtime)
+
+    @property
+    def size(self):
+        member = self._stat()
+        return 0 if member is None else member.size
+
+    def _get_content(self, decode):
+        try:
+            content = self._host.backend.read(self.path)
+        except OSError as exc:
+            raise RuntimeError(f"Cannot read {self.path}: {exc!r}") from None
+        if decode:
+            return self._host.backend.decode(content)
+        return content
+
+    def contains(self, pattern):
+        return bool(self.search([pattern])[pattern])
+
+    @classmethod
+    def search_files(cls, paths, patterns):
+        paths = list(dict.fromkeys(paths))
+        patterns = list(patterns)
+        result = {path: {pattern: [] for pattern in patterns} for path in paths}
+        regexes = [re.compile(pattern) for pattern in patterns]
+        for path in paths:
+            try:
+                content = cls._host.backend.decode(cls._host.backend.read(path))
+            except OSError:
+                continue
+            for lineno, line in enumerate(content.splitlines(), 1):
+                for pattern, regex in zip(patterns, regexes):
+                    if regex.search(line):
+                        result[path][pattern].append(lineno)
+        return result
+
+    def _get_wait_condition(self, attribute):
+        return None
+
+    @property
+    def md5sum(self):
+        return hashlib.md5(self.content).hexdigest()
+
+    @property
+    def sha256sum(self):
+        return hashlib.sha256(self.content).hexdigest()
+
+    @classmethod
+    def _get_checksums(cls, algorithm, paths):
+        checksums = dict.fromkeys(paths)
+        for path in paths:
+            try:
+                content = cls._host.backend.read(path)
+            except OSError:
+                continue
+            checksums[path] = hashlib.new(algorithm, content).hexdigest()
+        return checksums
+
+    def _get_block_digests(self, block_size, count):
+        content = self.content
+        return [
+            hashlib.sha256(content[i : i + block_size]).hexdigest()
+            for i in range(0, count * block_size, block_size)
+        ]
+
+    def listdir(self):
+        try:
+            return self._host.backend.listdir(self.path)
+        except OSError as exc:
+            raise RuntimeError(f"Cannot list {self.path}: {exc!r}") from None
+
+    def iterdir(self):
+        yield from self.listdir()
@@ -14,12 +14,36 @@ from testinfra.modules.base import Module
 
 
 class Group(Module):
-    """Test unix group"""
+    """Test unix group
+
+    Snapshots (see :ref:`snapshots`) are shared with ``host.user``, see
+    :class:`testinfra.modules.user.User`.
+    """
 
     def __init__(self, name):
         self.name = name
         super().__init__()
 
+    @classmethod
+    def snapshot(cls):
+        cls._host.user.snapshot()
+
+    @classmethod
+    def clear_snapshot(cls):
+        cls._host.user.clear_snapshot()
+
+    @classmethod
+    def _get_snapshot_data(cls):
+        # Return the snapshot or None
+        return cls._snapshot
+
+    def _get_group(self):
+        # Return the fields of the group entry from the snapshot
+        fields = self._get_snapshot_data()["groups"].get(self.name)
+        if fields is None:
+            raise RuntimeError(f"No such group: {self.name}")
+        return fields
+
     @property
     def exists(self):
         """Test if the group exists
@@ -29,6 +53,9 @@ class Group(Module):
         >>> host.group("nosuchgroup").exists
         False
         """
+        snapshot = self._get_snapshot_data()
+        if snapshot is not None:
+            return self.name in snapshot["groups"]
         return self.run_expect([0, 2], "getent group %s", self.name).rc == 0
 
     @property
@@ -38,12 +65,29 @@ class Group(Module):
         >>> host.group("anyname").get_all_groups
         ["root", "wheel", "man", "tty", <...>]
         """
+        snapshot = self._get_snapshot_data()
+        if snapshot is not None:
+            return list(snapshot["all_groups"])
         all_groups = [
             line.split(":")[0]
             for line in self.check_output("getent group").splitlines()
         ]
         return all_groups
 
+    def iter_all_groups(self):
+        """Iterate on local and remote group names
+
+        Like :attr:`get_all_groups` but ``getent group`` output is read by
+        chunks (see :meth:`testinfra.host.Host.iter_output`), memory usage
+        stays bounded with huge directories (LDAP, SSSD, ...)
+        """
+        snapshot = self._get_snapshot_data()
+        if snapshot is not None:
+            yield from snapshot["all_groups"]
+            return
+        for line in self.iter_output("getent group"):
+            yield line.split(":", 1)[0]
+
     @property
     def get_local_groups(self):
         """Returns a list of local group names
@@ -51,6 +95,9 @@ class Group(Module):
         >>> host.group("anyname").get_local_groups
         ["root", "wheel", "man", "tty", <...>]
         """
+        snapshot = self._get_snapshot_data()
+        if snapshot is not None:
+            return list(snapshot["local_groups"])
         local_groups = [
             line.split(":")[0]
             for line in self.check_output("cat /etc/group").splitlines()
@@ -59,15 +106,37 @@ class Group(Module):
 
     @property
     def gid(self):
+        if self._get_snapshot_data() is not None:
+            return int(self._get_group()[2])
         return int(self.check_output("getent group %s | cut -d':' -f3", self.name))
 
     @property
     def members(self):
         """Return all users that are members of this group."""
+        if self._get_snapshot_data() is not None:
+            users = self._get_group()[3]
+            return users.split(",") if users else []
         users = self.check_output("getent group %s | cut -d':' -f4", self.name)
         if users:
             return users.split(",")
         return []
 
+    @classmethod
+    def get_module_class(cls, host):
+        if host.backend.get_connection_type() == "image":
+            return ImageGroup
+        return super().get_module_class(host)
+
     def __repr__(self):
         return f"<group {self.name}>"
+
+
+class ImageGroup(Group):
+    """Groups of a container image read with the image backend"""
+
+    @classmethod
+    def _get_snapshot_data(cls):
+        # The image files cannot change, always use a snapshot
+        if cls._snapshot is None:
+            cls.snapshot()
+        return cls._snapshot
@@ -0,0 +1,108 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from testinfra.modules.base import Module
+from testinfra.utils.sampling import percentiles
+
+# curl timings are cumulative since the start of the request
+_CURL_FORMAT = (
+    "%{time_namelookup} %{time_connect} %{time_appconnect} "
+    "%{time_starttransfer} %{time_total} %{http_code}"
+)
+
+_TIMINGS = ("dns", "connect", "tls", "ttfb", "total")
+
+
+class Http(Module):
+    """Measure HTTP requests latency from the host
+
+    Requests are made with ``curl`` on the host, optionally within a
+    network namespace like :class:`testinfra.modules.addr.Addr`:
+
+    >>> api = host.http("https://api.example.com/health")
+    >>> timings = api.timings(count=20)
+    >>> timings["percentiles"]["ttfb"][95] < 0.2
+    True
+    >>> host.http("http://localhost:8080/", "ns1").timings()["status_codes"]
+    [200, 200, 200, 200, 200, 200, 200, 200, 200, 200]
+    """
+
+    def __init__(self, url, namespace=None):
+        self.url = url
+        self.namespace = namespace
+        super().__init__()
+
+    def timings(self, count=10, timeout=10, insecure=False):
+        """Make ``count`` sequential requests and return their timings
+
+        All requests run in a single command on the host. Return a dict of
+        series, with one value per successful request, in seconds:
+
+        - ``dns``: name resolution
+        - ``connect``: TCP connection, after name resolution
+        - ``tls``: TLS handshake, after TCP connection (0 without TLS)
+        - ``ttfb``: time to first byte, since the start of the request
+        - ``total``: whole request
+
+        ``status_codes`` with the HTTP status code of every request (0 if
+        the request failed, e.g. on timeout), and ``percentiles``, the 50,
+        90, 95, 99 and 100 (max) percentiles of each series (see
+        :func:`testinfra.utils.sampling.percentile`):
+
+        >>> timings = host.http("https://example.com/").timings(count=3)
+        >>> timings["connect"]
+        [0.0123, 0.0119, 0.0131]
+        >>> timings["percentiles"]["total"][50]
+        0.2184
+
+        ``timeout`` is the maximum time of each request in seconds, TLS
+        certificates are not verified if ``insecure`` is True.
+
+        :raises: RuntimeError if all requests failed
+        """
+        prefix = self._host.addr(None, self.namespace)._prefix
+        curl = self.find_command("curl")
+        options = "-k " if insecure else ""
+        out = self.check_output(
+            f"i=0; while [ $i -lt %s ]; do {prefix}%s -s -o /dev/null "
+            f"{options}--max-time %s -w %s %s; "
+            'echo " $?"; i=$((i + 1)); done',
+            str(count),
+            curl,
+            str(timeout),
+            _CURL_FORMAT,
+            self.url,
+        )
+        result = {name: [] for name in _TIMINGS}
+        result["status_codes"] = []
+        errors = []
+        for line in out.splitlines():
+            *times, code, rc = line.split()
+            result["status_codes"].append(int(code))
+            if rc != "0":
+                errors.append(rc)
+                continue
+            namelookup, connect, appconnect, starttransfer, total = map(float, times)
+            result["dns"].append(namelookup)
+            result["connect"].append(connect - namelookup)
+            result["tls"].append(appconnect - connect if appconnect else 0.0)
+            result["ttfb"].append(starttransfer)
+            result["total"].append(total)
+        if len(errors) == count:
+            raise RuntimeError(
+                f"All requests to {self.url} failed, curl exit codes: {errors}"
+            )
+        result["percentiles"] = percentiles(result, _TIMINGS)
+        return result
+
+    def __repr__(self):
+        return f"<http {self.url}>"
@@ -15,6 +15,12 @@ import json
 import re
 
 from testinfra.modules.base import Module
+from testinfra.utils.sampling import iter_samples, percentiles, sampling_script
+
+# Counters of /sys/class/net/<name>/statistics, rates are computed for
+# traffic counters and deltas for drop and error counters
+_STATS_RATES = ("rx_bytes", "tx_bytes", "rx_packets", "tx_packets")
+_STATS_DELTAS = ("rx_dropped", "tx_dropped", "rx_errors", "tx_errors")
 
 
 class Interface(Module):
@@ -27,6 +33,18 @@ class Interface(Module):
 
     >>> host.interface("eth0", "inet6").addresses
     ['fe80::e291:f5ff:fe98:6b8c']
+
+    With a snapshot of all interfaces, addresses and routes (see
+    :ref:`snapshots`), ``exists``, ``addresses``, ``link``, ``routes()``,
+    ``names()`` and ``default()`` are answered without running ``ip`` for
+    each one:
+
+    >>> host.interface.snapshot()
+    >>> [i for i in host.interface.names() if i.startswith("veth")]
+    ['veth1a2b3c4', 'veth5d6e7f8', ...]
+
+    On Linux the snapshot runs ``ip -json`` for addresses, links and
+    ipv4 and ipv6 routes in a single command.
     """
 
     def __init__(self, name, family=None):
@@ -91,6 +109,44 @@ class Interface(Module):
         """
         raise NotImplementedError
 
+    def stats(self, duration=10, interval=1):
+        """Sample the interface counters over a time window
+
+        The host runs a single sampling loop reading the interface
+        statistics every ``interval`` seconds during ``duration`` seconds.
+        Return a dict of time series with one value per interval:
+
+        - ``time``: seconds since sampling started (end of the interval)
+        - ``rx_bytes``, ``tx_bytes``, ``rx_packets`` and ``tx_packets``:
+          rates during the interval, per second
+        - ``rx_dropped``, ``tx_dropped``, ``rx_errors`` and ``tx_errors``:
+          number of dropped packets and errors during the interval
+
+        and ``totals``, the counters increase over the whole window, and
+        ``percentiles``, the 50, 90, 95, 99 and 100 (max) percentiles of each
+        series (see :func:`testinfra.utils.sampling.percentile`):
+
+        >>> eth0 = host.interface("eth0").stats(duration=30)
+        >>> eth0["percentiles"]["rx_bytes"][95]
+        1179648.0
+        >>> eth0["totals"]["rx_dropped"]
+        0
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def stats_all(cls, duration=10, interval=1):
+        """Sample the counters of all interfaces over a time window
+
+        Return a dict of interface name to statistics like :meth:`stats`,
+        with a single sampling loop for all interfaces:
+
+        >>> stats = host.interface.stats_all(duration=30)
+        >>> {name: s["totals"]["rx_errors"] for name, s in stats.items()}
+        {'lo': 0, 'eth0': 0}
+        """
+        raise NotImplementedError
+
     def __repr__(self):
         return f"<interface {self.name}>"
 
@@ -134,16 +190,127 @@ class LinuxInterface(Interface):
             ip_cmd = f"{ip_cmd} -f {self.family}"
         return ip_cmd
 
+    @classmethod
+    def _get_snapshot(cls):
+        ip = cls.find_command("ip")
+        out = cls.check_output(
+            f"{ip} -json addr show && echo == && {ip} -json link show && "
+            f"echo == && {ip} -json -4 route show && echo == && "
+            f"{ip} -json -6 route show"
+        )
+        sections = [""]
+        for line in out.splitlines():
+            if line == "==":
+                sections.append("")
+            else:
+                sections[-1] += line
+        addrs, links, routes4, routes6 = (
+            json.loads(section or "[]") for section in sections
+        )
+        addresses = {}
+        for iface in addrs:
+            addresses[iface["ifname"]] = [
+                (addr["family"], addr["local"]) for addr in iface.get("addr_info", [])
+            ]
+        routes = {}
+        defaults = {}
+        for family, family_routes in (("inet", routes4), ("inet6", routes6)):
+            for route in family_routes:
+                # Like "ip route list dev <name>", dev is not in the routes
+                route = dict(route)
+                dev = route.pop("dev", None)
+                routes.setdefault((family, dev), []).append(route)
+                if route["dst"] == "default" and dev is not None:
+                    defaults[family] = dev
+        return {
+            "links": {link["ifname"]: link for link in links},
+            "addresses": addresses,
+            "routes": routes,
+            "defaults": defaults,
+        }
+
+    def _use_snapshot(self):
+        return self._snapshot is not None and self.family in (None, "inet", "inet6")
+
     @property
     def exists(self):
+        if self._use_snapshot():
+            return self.name in self._snapshot["links"]
         return self.run_test(f"{self._ip} link show %s", self.name).rc == 0
 
     @property
     def speed(self):
         return int(self.check_output("cat /sys/class/net/%s/speed", self.name))
 
+    def stats(self, duration=10, interval=1):
+        try:
+            return self._sample_stats(
+                self._host.backend.quote("%s", self.name), duration, interval
+            )[self.name]
+        except KeyError:
+            raise RuntimeError(f"No such interface: {self.name}") from None
+
+    @classmethod
+    def stats_all(cls, duration=10, interval=1):
+        return cls._sample_stats("*", duration, interval)
+
+    @classmethod
+    def _sample_stats(cls, pattern, duration, interval):
+        paths = " ".join(
+            f"{pattern}/statistics/{counter}"
+            for counter in _STATS_RATES + _STATS_DELTAS
+        )
+        # Each sample is "<name>/statistics/<counter>:<value>" lines
+        out = cls.check_output(
+            "cd /sys/class/net && "
+            + sampling_script(f"grep -H . {paths} 2>/dev/null", duration, interval)
+        )
+        samples = []
+        for uptime, lines in iter_samples(out.splitlines()):
+            counters = {}
+            samples.append((uptime, counters))
+            for line in lines:
+                path, value = line.rsplit(":", 1)
+                name, _, counter = path.split("/")
+                counters.setdefault(name, {})[counter] = int(value)
+
+        results = {}
+        for (start, prev), (end, current) in zip(samples, samples[1:]):
+            elapsed = end - start
+            for name, counters in current.items():
+                if name not in prev:
+                    continue
+                result = results.setdefault(
+                    name,
+                    {"time": [], **{c: [] for c in _STATS_RATES + _STATS_DELTAS}},
+                )
+                result["time"].append(round(end - samples[0][0], 2))
+                for counter in _STATS_RATES + _STATS_DELTAS:
+                    # Counters may be reset (or wrap on 32 bits drivers)
+                    delta = max(0, counters[counter] - prev[name][counter])
+                    if counter in _STATS_RATES:
+                        delta = delta / elapsed if elapsed > 0 else 0.0
+                    result[counter].append(delta)
+        for name, result in results.items():
+            first = samples[0][1].get(name)
+            last = samples[-1][1][name]
+            result["totals"] = {
+                counter: max(0, last[counter] - first[counter]) if first else None
+                for counter in _STATS_RATES + _STATS_DELTAS
+            }
+            result["percentiles"] = percentiles(result, _STATS_RATES + _STATS_DELTAS)
+        return results
+
     @property
     def addresses(self):
+        if self._use_snapshot():
+            if self.name not in self._snapshot["links"]:
+                raise RuntimeError(f"No such interface: {self.name}")
+            return [
+                addr
+                for family, addr in self._snapshot["addresses"].get(self.name, [])
+                if self.family in (None, family)
+            ]
         stdout = self.check_output(f"{self._ip} addr show %s", self.name)
         addrs = []
         for line in stdout.splitlines():
@@ -154,11 +321,30 @@ class LinuxInterface(Interface):
 
     @property
     def link(self):
+        if self._use_snapshot():
+            if self.name not in self._snapshot["links"]:
+                raise RuntimeError(f"No such interface: {self.name}")
+            return [self._snapshot["links"][self.name]]
         return json.loads(
             self.check_output(f"{self._ip} --json link show %s", self.name)
         )
 
     def routes(self, scope=None):
+        if self._use_snapshot():
+            if self.name not in self._snapshot["links"]:
+                raise RuntimeError(f"No such interface: {self.name}")
+            # ip route lists ipv4 routes by default
+            routes = self._snapshot["routes"].get(
+                (self.family or "inet", self.name), []
+            )
+            if scope is None:
+                return routes
+            # Like dev, scope is not in the routes filtered by scope
+            return [
+                {key: value for key, value in route.items() if key != "scope"}
+                for route in routes
+                if route.get("scope", "global") == scope
+            ]
         cmd = f"{self._ip} --json route list dev %s"
 
         if scope is None:
@@ -171,6 +357,9 @@ class LinuxInterface(Interface):
     @classmethod
     def default(cls, family=None):
         _default = cls(None, family=family)
+        if _default._use_snapshot():
+            _default.name = cls._snapshot["defaults"].get(family or "inet")
+            return _default
         out = cls.check_output(f"{_default._ip} route ls")
         for line in out.splitlines():
             if "default" in line:
@@ -181,6 +370,8 @@ class LinuxInterface(Interface):
 
     @classmethod
     def names(cls):
+        if cls._snapshot is not None:
+            return list(cls._snapshot["links"])
         # -o is to tell the ip command to return one line per interface
         out = cls.check_output(f"{cls(None)._ip} -o link show")
         interfaces = []
@@ -10,11 +10,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import posixpath
+
 from testinfra.modules.base import Module
 
 
 class MountPoint(Module):
-    """Test Mount Points"""
+    """Test Mount Points
+
+    With a snapshot of the mount table (see :ref:`snapshots`), ``exists``,
+    ``device``, ``filesystem``, ``options``, ``get_mountpoints()`` and
+    ``for_path()`` are answered without reading the mount table for each
+    mount point:
+
+    >>> host.mount_point.snapshot()
+    >>> for path in ("/var/lib/docker", "/srv/data", "/tmp"):
+    ...     assert "nodev" in host.mount_point.for_path(path).options
+    """
 
     def __init__(self, path, _attrs_cache=None):
         self.path = path
@@ -25,6 +37,57 @@ class MountPoint(Module):
     def _iter_mountpoints(cls):
         raise NotImplementedError
 
+    @classmethod
+    def _get_snapshot(cls):
+        # Mount points are stored in a tree of path components, each node
+        # holds the mount points of its path in mount table order
+        mountpoints = list(cls._iter_mountpoints())
+        tree = {"mounts": [], "children": {}}
+        for mountpoint in mountpoints:
+            node = tree
+            for part in mountpoint["path"].split("/"):
+                if part:
+                    node = node["children"].setdefault(
+                        part, {"mounts": [], "children": {}}
+                    )
+            node["mounts"].append(mountpoint)
+        return {"mountpoints": mountpoints, "tree": tree}
+
+    @classmethod
+    def for_path(cls, path):
+        """Return the MountPoint the given path lives on
+
+        The mount point is the longest prefix of the path in the mount
+        table, the path doesn't need to exist and symbolic links are not
+        resolved:
+
+        >>> host.mount_point.for_path("/var/lib/docker/overlay2").path
+        '/var/lib/docker'
+        >>> host.mount_point.for_path("/etc/passwd").filesystem
+        'ext4'
+
+        When a path has several mount points stacked on it, the last mounted
+        one (the visible one) is returned. The mount table is read once per
+        call, take a :meth:`snapshot` to look up many paths.
+
+        :raises: ValueError if the path is not absolute
+        """
+        if not path.startswith("/"):
+            raise ValueError(f"{path} is not an absolute path")
+        node = cls._get_current_snapshot()["tree"]
+        mountpoint = node["mounts"][-1] if node["mounts"] else None
+        for part in posixpath.normpath(path).split("/"):
+            if not part:
+                continue
+            node = node["children"].get(part)
+            if node is None:
+                break
+            if node["mounts"]:
+                mountpoint = node["mounts"][-1]
+        if mountpoint is None:
+            return None
+        return cls(mountpoint["path"], mountpoint)
+
     @property
     def exists(self):
         """Return True if the mountpoint exists
@@ -40,6 +103,12 @@ class MountPoint(Module):
 
     @property
     def _attrs(self):
+        if self._attrs_cache is None and self._snapshot is not None:
+            node = self._snapshot["tree"]
+            for part in self.path.split("/"):
+                if part and node is not None:
+                    node = node["children"].get(part)
+            self._attrs_cache = node["mounts"][0] if node and node["mounts"] else {}
         if self._attrs_cache is None:
             for mountpoint in self._iter_mountpoints():
                 if mountpoint["path"] == self.path:
@@ -87,10 +156,14 @@ class MountPoint(Module):
         [<MountPoint(path=/proc, device=proc, filesystem=proc, options=rw,nosuid,nodev,noexec,relatime)>,
          <MountPoint(path=/, device=/dev/sda1, filesystem=ext4, options=rw,relatime,errors=remount-ro,data=ordered)>]
         """
-        mountpoints = []
-        for mountpoint in cls._iter_mountpoints():
-            mountpoints.append(cls(mountpoint["path"], mountpoint))
-        return mountpoints
+        if cls._snapshot is not None:
+            mountpoints = cls._snapshot["mountpoints"]
+        else:
+            mountpoints = cls._iter_mountpoints()
+        result = []
+        for mountpoint in mountpoints:
+            result.append(cls(mountpoint["path"], mountpoint))
+        return result
 
     @classmethod
     def get_module_class(cls, host):
@@ -10,17 +10,378 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
+import operator
+import re
+import sqlite3
+import struct
+import tempfile
+from typing import Optional
 
 from testinfra.modules.base import Module
 
 
+class Version(str):
+    """Package version ordered like the package system does
+
+    A `str` that can be compared with other versions or strings:
+
+    >>> host.package("openssl").full_version >= "3.0.7-1"
+    True
+
+    Implementations: :class:`DebianVersion` (dpkg), :class:`RpmVersion`
+    (rpm and pacman) and :class:`ApkVersion` (apk).
+
+    Versions hash like their string, so equal versions written differently
+    (e.g. ``1.0`` and ``0:1.0``) are different `dict` keys and `set` items.
+    """
+
+    __hash__ = str.__hash__
+
+    @staticmethod
+    def _compare(a, b):
+        # Return a negative, zero or positive number if a is lower, equal or
+        # greater than b
+        raise NotImplementedError
+
+    def _cmp(self, other):
+        if not isinstance(other, str):
+            return NotImplemented
+        return self._compare(str(self), str(other))
+
+    def __eq__(self, other):
+        rc = self._cmp(other)
+        return rc if rc is NotImplemented else rc == 0
+
+    def __ne__(self, other):
+        rc = self._cmp(other)
+        return rc if rc is NotImplemented else rc != 0
+
+    def __lt__(self, other):
+        rc = self._cmp(other)
+        return rc if rc is NotImplemented else rc < 0
+
+    def __le__(self, other):
+        rc = self._cmp(other)
+        return rc if rc is NotImplemented else rc <= 0
+
+    def __gt__(self, other):
+        rc = self._cmp(other)
+        return rc if rc is NotImplemented else rc > 0
+
+    def __ge__(self, other):
+        rc = self._cmp(other)
+        return rc if rc is NotImplemented else rc >= 0
+
+
+def _cmp(a, b):
+    return (a > b) - (a < b)
+
+
+def _dpkg_order(c):
+    if c.isdigit():
+        return 0
+    if c.isalpha():
+        return ord(c)
+    if c == "~":
+        return -1
+    if c:
+        return ord(c) + 256
+    return 0
+
+
+def _dpkg_verrevcmp(a, b):
+    # Port of dpkg verrevcmp() from lib/dpkg/version.c
+    i = j = 0
+    while i < len(a) or j < len(b):
+        while (i < len(a) and not a[i].isdigit()) or (
+            j < len(b) and not b[j].isdigit()
+        ):
+            ac = _dpkg_order(a[i] if i < len(a) else "")
+            bc = _dpkg_order(b[j] if j < len(b) else "")
+            if ac != bc:
+                return ac - bc
+            i += 1
+            j += 1
+        while i < len(a) and a[i] == "0":
+            i += 1
+        while j < len(b) and b[j] == "0":
+            j += 1
+        first_diff = 0
+        while i < len(a) and a[i].isdigit() and j < len(b) and b[j].isdigit():
+            if not first_diff:
+                first_diff = ord(a[i]) - ord(b[j])
+            i += 1
+            j += 1
+        if i < len(a) and a[i].isdigit():
+            return 1
+        if j < len(b) and b[j].isdigit():
+            return -1
+        if first_diff:
+            return first_diff
+    return 0
+
+
+def _split_evr(version):
+    # Return (epoch, version, release) from [epoch:]version[-release]
+    epoch, sep, rest = version.partition(":")
+    if not sep or not epoch.isdigit():
+        epoch, rest = "0", version
+    upstream, sep, release = rest.rpartition("-")
+    if not sep:
+        return int(epoch), rest, None
+    return int(epoch), upstream, release
+
+
+class DebianVersion(Version):
+    """Version ordered like ``dpkg --compare-versions``"""
+
+    @staticmethod
+    def _compare(a, b):
+        a_epoch, a_upstream, a_revision = _split_evr(a)
+        b_epoch, b_upstream, b_revision = _split_evr(b)
+        return (
+            _cmp(a_epoch, b_epoch)
+            or _dpkg_verrevcmp(a_upstream, b_upstream)
+            or _dpkg_verrevcmp(a_revision or "", b_revision or "")
+        )
+
+
+def _rpmvercmp(a, b):
+    # Port of rpmvercmp() from rpmio/rpmvercmp.c
+    if a == b:
+        return 0
+
+    def is_separator(c):
+        return not (c.isascii() and c.isalnum()) and c not in "~^"
+
+    i = j = 0
+    while i < len(a) or j < len(b):
+        while i < len(a) and is_separator(a[i]):
+            i += 1
+        while j < len(b) and is_separator(b[j]):
+            j += 1
+        one = a[i] if i < len(a) else ""
+        two = b[j] if j < len(b) else ""
+        # "~" sort before everything, even the end of the version
+        if one == "~" or two == "~":
+            if one != "~":
+                return 1
+            if two != "~":
+                return -1
+            i += 1
+            j += 1
+            continue
+        # "^" sort after the end of the version but before anything else
+        if one == "^" or two == "^":
+            if not one:
+                return -1
+            if not two:
+                return 1
+            if one != "^":
+                return 1
+            if two != "^":
+                return -1
+            i += 1
+            j += 1
+            continue
+        if not (one and two):
+            break
+        pattern = r"[0-9]*" if one.isdigit() else r"[a-zA-Z]*"
+        seg1 = re.compile(pattern).match(a, i).group()
+        seg2 = re.compile(pattern).match(b, j).group()
+        i += len(seg1)
+        j += len(seg2)
+        if not seg2:
+            # numeric segments are newer than alpha segments
+            return 1 if one.isdigit() else -1
+        if one.isdigit():
+            seg1 = seg1.lstrip("0")
+            seg2 = seg2.lstrip("0")
+            if len(seg1) != len(seg2):
+                return _cmp(len(seg1), len(seg2))
+        if seg1 != seg2:
+            return _cmp(seg1, seg2)
+    return _cmp(i < len(a), j < len(b))
+
+
+class RpmVersion(Version):
+    """Version ordered like rpm (rpmvercmp) and pacman (vercmp)
+
+    The release is only compared when both versions have one.
+    """
+
+    @staticmethod
+    def _compare(a, b):
+        a_epoch, a_version, a_release = _split_evr(a)
+        b_epoch, b_version, b_release = _split_evr(b)
+        rc = _cmp(a_epoch, b_epoch) or _rpmvercmp(a_version, b_version)
+        if rc or a_release is None or b_release is None:
+            return rc
+        return _rpmvercmp(a_release, b_release)
+
+
+_APK_VERSION_RE = re.compile(
+    r"^(?P<numbers>\d+(?:\.\d+)*)(?P<letter>[a-z])?"
+    r"(?P<suffixes>(?:_(?:alpha|beta|pre|rc|cvs|svn|git|hg|p)\d*)*)"
+    r"(?:~[0-9a-f]+)?(?:-r(?P<revision>\d+))?$"
+)
+_APK_SUFFIXES = {
+    "alpha": -4,
+    "beta": -3,
+    "pre": -2,
+    "rc": -1,
+    "cvs": 1,
+    "svn": 2,
+    "git": 3,
+    "hg": 4,
+    "p": 5,
+}
+
+
+def _apk_key(version):
+    match = _APK_VERSION_RE.match(version)
+    if match is None:
+        return None
+    suffixes = [
+        (_APK_SUFFIXES[name], int(number or 0))
+        for name, number in re.findall(r"_([a-z]+)(\d*)", match.group("suffixes"))
+    ]
+    return (
+        [int(n) for n in match.group("numbers").split(".")],
+        match.group("letter") or "",
+        # a release (no suffix) sort between pre-release and post-release
+        # suffixes
+        suffixes + [(0, 0)],
+        int(match.group("revision") or 0),
+    )
+
+
+class ApkVersion(Version):
+    """Version ordered like ``apk version -t``
+
+    Invalid versions are compared as strings.
+    """
+
+    @staticmethod
+    def _compare(a, b):
+        a_key, b_key = _apk_key(a), _apk_key(b)
+        if a_key is None or b_key is None:
+            return _cmp(a, b)
+        return _cmp(a_key, b_key)
+
+
+_CONSTRAINT_RE = re.compile(r"^\s*(>=|<=|==|!=|=|<|>)?\s*(\S+)\s*$")
+_CONSTRAINT_OPERATORS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+}
+
+
 class Package(Module):
-    """Test packages status and version"""
+    """Test packages status and version
+
+    Checking many packages can be done from a single snapshot of the
+    package database (see :ref:`snapshots`): ``is_installed``, ``version``
+    and ``release`` are then answered without running commands for each
+    package. Packages are looked up by exact name, packages installed in
+    several versions (e.g. kernel) are still queried directly.
+
+    >>> host.package.snapshot()
+    >>> host.package("nginx").version  # no command run
+    '1.22.1-9'
+
+    Snapshots are supported with apk, apt, brew, pacman, pkg (FreeBSD) and
+    rpm.
+    """
+
+    _version_class: Optional[type[Version]] = None
 
     def __init__(self, name):
         self.name = name
         super().__init__()
 
+    @classmethod
+    def _get_snapshot(cls):
+        return cls._index(cls._iter_snapshot_packages())
+
+    @classmethod
+    def _iter_snapshot_packages(cls):
+        # Return an iterable of (name, {"version": ..., "release": ...})
+        raise NotImplementedError
+
+    @classmethod
+    def satisfies(cls, constraints):
+        """Check installed packages versions against constraints
+
+        `constraints` is a `dict` of package name -> constraint like
+        ``">=3.0.7-1"`` or ``">=1.2, <2"`` (None to only check the package
+        is installed). Return a `dict` of package name -> `bool`.
+
+        Full versions (see :attr:`full_version`) are compared locally from
+        the snapshot of the package database, or from a temporary one if
+        there is none.
+
+        >>> host.package.satisfies({"openssl": ">=3.0.7", "nginx": None, "zsh": "<5"})
+        {'openssl': True, 'nginx': True, 'zsh': False}
+
+        Supported package systems: apk, apt, pacman and rpm.
+        """
+        if cls._version_class is None:
+            raise NotImplementedError
+        snapshot = cls._get_current_snapshot()
+        result = {}
+        for name, constraint in constraints.items():
+            entry = snapshot.get(name, {})
+            if entry is None:
+                # Installed in several versions, query directly
+                package = cls(name)
+                version = package.full_version if package.is_installed else None
+            elif entry:
+                version = cls._get_full_version(entry["version"], entry.get("release"))
+            else:
+                version = None
+            if version is None:
+                result[name] = False
+                continue
+            result[name] = True
+            for part in (constraint or "").split(","):
+                if not part.strip():
+                    continue
+                match = _CONSTRAINT_RE.match(part)
+                if match is None:
+                    raise ValueError(f"Invalid version constraint: {constraint}")
+                op, other = match.groups()
+                if not _CONSTRAINT_OPERATORS[op or "=="](version, other):
+                    result[name] = False
+                    break
+        return result
+
+    @classmethod
+    def _get_full_version(cls, version, release):
+        if release:
+            version = f"{version}-{release}"
+        return cls._version_class(version)
+
+    @staticmethod
+    def _index(packages):
+        snapshot = {}
+        for name, info in packages:
+            # Ambiguous names are set to None
+            snapshot[name] = None if name in snapshot else info
+        return snapshot
+
+    def _get_snapshot_entry(self):
+        # Return the snapshot entry of the package, {} if the package is not
+        # installed or None if the snapshot cannot tell
+        if self._snapshot is None:
+            return None
+        return self._snapshot.get(self.name, {})
+
     @property
     def is_installed(self):
         """Test if the package is installed
@@ -56,14 +417,39 @@ class Package(Module):
 
         >>> host.package("nginx").version
         '1.2.1-2.2+wheezy3'
+
+        See :attr:`full_version` to compare versions.
         """
         raise NotImplementedError
 
+    @property
+    def full_version(self):
+        """Return the package version and release as a :class:`Version`
+
+        The version is ordered like the package system does:
+
+        >>> host.package("nginx").full_version
+        '1.20.1-14.el9'
+        >>> host.package("nginx").full_version >= "1.20.1-2"
+        True
+
+        Supported package systems: apk, apt, pacman and rpm.
+        """
+        if self._version_class is None:
+            raise NotImplementedError
+        try:
+            release = self.release
+        except NotImplementedError:
+            release = None
+        return self._get_full_version(self.version, release)
+
     def __repr__(self):
         return f"<package {self.name}>"
 
     @classmethod
     def get_module_class(cls, host):
+        if host.backend.get_connection_type() == "image":
+            return ImagePackage
         if host.system_info.type == "windows":
             return ChocolateyPackage
         if host.system_info.type == "freebsd":
@@ -102,8 +488,31 @@ class Package(Module):
 
 
 class DebianPackage(Package):
+    _version_class = DebianVersion
+
+    @classmethod
+    def _iter_snapshot_packages(cls):
+        out = cls.check_output(
+            "dpkg-query -W -f '${Status} ${Package} ${Architecture} ${Version}\\n'"
+        )
+        for line in out.splitlines():
+            fields = line.split()
+            if (
+                len(fields) != 6
+                or fields[0] not in ("install", "hold")
+                or fields[1:3] != ["ok", "installed"]
+            ):
+                continue
+            _, _, _, name, arch, version = fields
+            info = {"version": version}
+            yield name, info
+            yield f"{name}:{arch}", info
+
     @property
     def is_installed(self):
+        entry = self._get_snapshot_entry()
+        if entry is not None:
+            return bool(entry)
         result = self.run_test("dpkg-query -f '${Status}' -W %s", self.name)
         if result.rc == 1:
             return False
@@ -117,6 +526,9 @@ class DebianPackage(Package):
 
     @property
     def version(self):
+        entry = self._get_snapshot_entry()
+        if entry:
+            return entry["version"]
         out = self.check_output("dpkg-query -f '${Status} ${Version}' -W %s", self.name)
         splitted = out.split()
         assert splitted[0].lower() in (
@@ -127,8 +539,17 @@ class DebianPackage(Package):
 
 
 class FreeBSDPackage(Package):
+    @classmethod
+    def _iter_snapshot_packages(cls):
+        for line in cls.check_output("pkg query -a '%n %v'").splitlines():
+            name, version = line.split()
+            yield name, {"version": version}
+
     @property
     def is_installed(self):
+        entry = self._get_snapshot_entry()
+        if entry is not None:
+            return bool(entry)
         EX_UNAVAILABLE = 69
         return (
             self.run_expect([0, EX_UNAVAILABLE], "pkg query %%n %s", self.name).rc == 0
@@ -140,6 +561,9 @@ class FreeBSDPackage(Package):
 
     @property
     def version(self):
+        entry = self._get_snapshot_entry()
+        if entry:
+            return entry["version"]
         return self.check_output("pkg query %%v %s", self.name)
 
 
@@ -161,8 +585,22 @@ class OpenBSDPackage(Package):
 
 
 class RpmPackage(Package):
+    _version_class = RpmVersion
+
+    @classmethod
+    def _iter_snapshot_packages(cls):
+        out = cls.check_output(
+            "rpm -qa --queryformat '%{NAME} %{VERSION} %{RELEASE}\\n'"
+        )
+        for line in out.splitlines():
+            name, version, release = line.split()
+            yield name, {"version": version, "release": release}
+
     @property
     def is_installed(self):
+        entry = self._get_snapshot_entry()
+        if entry is not None:
+            return bool(entry)
         result = self.run_test("rpm -q --quiet %s 2>&1", self.name)
         if result.succeeded:
             return True
@@ -175,36 +613,74 @@ class RpmPackage(Package):
 
     @property
     def version(self):
+        entry = self._get_snapshot_entry()
+        if entry:
+            return entry["version"]
         return self.check_output('rpm -q --queryformat="%%{VERSION}" %s', self.name)
 
     @property
     def release(self):
+        entry = self._get_snapshot_entry()
+        if entry:
+            return entry["release"]
         return self.check_output('rpm -q --queryformat="%%{RELEASE}" %s', self.name)
 
 
 class AlpinePackage(Package):
+    _version_class = ApkVersion
+
+    @classmethod
+    def _iter_snapshot_packages(cls):
+        # Lines are like musl-1.2.4-r2
+        for line in cls.check_output("apk info -v").splitlines():
+            name, version, release = line.rsplit("-", 2)
+            yield name, {"version": version, "release": release}
+
     @property
     def is_installed(self):
+        entry = self._get_snapshot_entry()
+        if entry is not None:
+            return bool(entry)
         return self.run_test("apk -e info %s", self.name).rc == 0
 
     @property
     def version(self):
+        entry = self._get_snapshot_entry()
+        if entry:
+            return entry["version"]
         out = self.check_output("apk -e -v info %s", self.name).split("-")
         return out[-2]
 
     @property
     def release(self):
+        entry = self._get_snapshot_entry()
+        if entry:
+            return entry["release"]
         out = self.check_output("apk -e -v info %s", self.name).split("-")
         return out[-1]
 
 
 class ArchPackage(Package):
+    _version_class = RpmVersion
+
+    @classmethod
+    def _iter_snapshot_packages(cls):
+        for line in cls.check_output("pacman -Q").splitlines():
+            name, version = line.split()
+            yield name, {"version": version}
+
     @property
     def is_installed(self):
+        entry = self._get_snapshot_entry()
+        if entry is not None:
+            return bool(entry)
         return self.run_test("pacman -Q %s", self.name).rc == 0
 
     @property
     def version(self):
+        entry = self._get_snapshot_entry()
+        if entry:
+            return entry["version"]
         out = self.check_output("pacman -Q %s", self.name).split(" ")
         return out[1]
 
@@ -229,13 +705,29 @@ class ChocolateyPackage(Package):
 
 
 class HomebrewPackage(Package):
+    @classmethod
+    def _iter_snapshot_packages(cls):
+        info = cls.check_output("brew info --formula --json --installed")
+        for formula in json.loads(info):
+            if formula["installed"]:
+                yield (
+                    formula["name"],
+                    {"version": formula["installed"][0]["version"]},
+                )
+
     @property
     def is_installed(self):
+        entry = self._get_snapshot_entry()
+        if entry is not None:
+            return bool(entry)
         info = self.check_output("brew info --formula --json %s", self.name)
         return len(json.loads(info)[0]["installed"]) > 0
 
     @property
     def version(self):
+        entry = self._get_snapshot_entry()
+        if entry:
+            return entry["version"]
         info = self.check_output("brew info --formula --json %s", self.name)
         version = json.loads(info)[0]["installed"][0]["version"]
         return version
@@ -243,3 +735,140 @@ class HomebrewPackage(Package):
     @property
     def release(self):
         raise NotImplementedError
+
+
+def _parse_dpkg_status(content):
+    # Paragraphs of "Field: value" lines separated by empty lines
+    for paragraph in content.decode("utf-8", "replace").split("\n\n"):
+        fields = {}
+        for line in paragraph.splitlines():
+            if line and not line[0].isspace() and ":" in line:
+                key, value = line.split(":", 1)
+                fields[key] = value.strip()
+        status = fields.get("Status", "").split()
+        if status[:1] not in (["install"], ["hold"]) or status[1:3] != [
+            "ok",
+            "installed",
+        ]:
+            continue
+        info = {"version": fields["Version"]}
+        yield fields["Package"], info
+        yield f"{fields['Package']}:{fields.get('Architecture')}", info
+
+
+def _parse_apk_installed(content):
+    # Records of "X:value" lines separated by empty lines
+    for record in content.decode("utf-8", "replace").split("\n\n"):
+        fields = dict(
+            line.split(":", 1) for line in record.splitlines() if line[1:2] == ":"
+        )
+        if "P" in fields and "V" in fields:
+            version, _, release = fields["V"].rpartition("-")
+            yield fields["P"], {"version": version, "release": release}
+
+
+# Header tags, see rpmtag.h
+_RPMTAG_NAME = 1000
+_RPMTAG_VERSION = 1001
+_RPMTAG_RELEASE = 1002
+
+
+def _parse_rpm_header(blob):
+    # Header blob: index length, data length, index entries (tag, type,
+    # offset, count) then data. Only parse the needed string tags.
+    il, _ = struct.unpack(">ii", blob[:8])
+    data = 8 + il * 16
+    tags = {}
+    for i in range(il):
+        tag, _, offset, _ = struct.unpack(">iiii", blob[8 + i * 16 : 24 + i * 16])
+        if tag in (_RPMTAG_NAME, _RPMTAG_VERSION, _RPMTAG_RELEASE):
+            start = data + offset
+            tags[tag] = blob[start : blob.index(b"\0", start)].decode()
+    return tags
+
+
+def _parse_rpmdb_sqlite(content):
+    with tempfile.NamedTemporaryFile(suffix=".sqlite") as f:
+        f.write(content)
+        f.flush()
+        conn = sqlite3.connect(f"file:{f.name}?mode=ro&immutable=1", uri=True)
+        try:
+            blobs = [row[0] for row in conn.execute("SELECT blob FROM Packages")]
+        finally:
+            conn.close()
+    for blob in blobs:
+        tags = _parse_rpm_header(blob)
+        yield (
+            tags[_RPMTAG_NAME],
+            {
+                "version": tags[_RPMTAG_VERSION],
+                "release": tags[_RPMTAG_RELEASE],
+            },
+        )
+
+
+class ImagePackage(Package):
+    """Packages of a container image read with the image backend
+
+    The package database is parsed on first use: dpkg, apk or rpm (only
+    the sqlite database used since RHEL 9 and Fedora 33).
+    """
+
+    _databases = (
+        ("/var/lib/dpkg/status", DebianVersion, _parse_dpkg_status),
+        ("/lib/apk/db/installed", ApkVersion, _parse_apk_installed),
+        ("/usr/lib/sysimage/rpm/rpmdb.sqlite", RpmVersion, _parse_rpmdb_sqlite),
+        ("/var/lib/rpm/rpmdb.sqlite", RpmVersion, _parse_rpmdb_sqlite),
+    )
+
+    @classmethod
+    def _iter_snapshot_packages(cls):
+        backend = cls._host.backend
+        for path, version_class, parse in cls._databases:
+            if backend.lookup(path) is None:
+                continue
+            cls._version_class = version_class
+            return parse(backend.read(path))
+        raise NotImplementedError
+
+    @classmethod
+    def satisfies(cls, constraints):
+        if cls._snapshot is None:
+            cls.snapshot()
+        return super().satisfies(constraints)
+
+    def _get_snapshot_entry(self):
+        if self._snapshot is None:
+            self.snapshot()
+        return self._snapshot.get(self.name, {})
+
+    @property
+    def full_version(self):
+        # _version_class is set when loading the package database
+        if self._snapshot is None:
+            self.snapshot()
+        return super().full_version
+
+    def _get_info(self, key):
+        entry = self._get_snapshot_entry()
+        if entry is None:
+            raise RuntimeError(
+                f"The package {self.name} is installed in several versions"
+            )
+        if not entry:
+            raise RuntimeError(f"The package {self.name} is not installed")
+        if key not in entry:
+            raise NotImplementedError
+        return entry[key]
+
+    @property
+    def is_installed(self):
+        return self._get_snapshot_entry() != {}
+
+    @property
+    def version(self):
+        return self._get_info("version")
+
+    @property
+    def release(self):
+        return self._get_info("release")
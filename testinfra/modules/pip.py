@@ -101,6 +101,23 @@ class Pip(Module):
                     pkgs[name] = {"version": version}
         return pkgs
 
+    @classmethod
+    def iter_packages(cls, pip_path="pip"):
+        """Iterate on installed packages and versions returned by `pip list`
+
+        Like :meth:`get_packages` but yield (name, {"version": ...}) pairs
+        while reading `pip list` output by chunks (see
+        :meth:`testinfra.host.Host.iter_output`):
+
+        >>> dict(host.pip.iter_packages(pip_path='~/venv/website/bin/pip'))
+        {'Django': {'version': '1.10.2'},
+         'mywebsite': {'version': '1.0a3'},
+         'psycopg2': {'version': '2.6.2'}}
+        """
+        for line in cls.iter_output("%s list --no-index --format=freeze", pip_path):
+            name, version = line.split("==", 1)
+            yield name, {"version": version}
+
     @classmethod
     def get_outdated_packages(cls, pip_path="pip"):
         """Get all outdated packages with the current and latest version
@@ -13,6 +13,7 @@
 from typing import Any
 
 from testinfra.modules.base import InstanceModule
+from testinfra.utils.sampling import iter_samples, percentiles, sampling_script
 
 
 def int_or_float(value):
@@ -25,6 +26,16 @@ def int_or_float(value):
             return value
 
 
+# Each sample is the content of /proc/*/stat followed by the read_bytes and
+# write_bytes lines of /proc/*/io
+_SAMPLE_COMMANDS = (
+    "cat /proc/[0-9]*/stat 2>/dev/null; "
+    "grep -H -e ^read_bytes -e ^write_bytes /proc/[0-9]*/io 2>/dev/null"
+)
+
+_SAMPLE_METRICS = ("cpu", "rss", "read_bytes", "write_bytes", "threads")
+
+
 class _Process(dict[str, Any]):
     def __getattr__(self, key):
         try:
@@ -68,16 +79,67 @@ class Process(InstanceModule):
     >>> sum([p.pmem for p in host.process.filter(comm="php5-fpm")])
     19.2
 
+    With a snapshot of all processes (see :ref:`snapshots`), ``filter()``
+    and ``get()`` look up processes in the snapshot (indexed by pid, ppid,
+    comm and user) instead of running ``ps`` on each call, and the snapshot
+    attributes of the returned processes do not need another ``ps`` call:
+
+    >>> host.process.snapshot()
+    >>> host.process.filter(user="www-data", comm="nginx")
+    [<process nginx (pid=2716)>, <process nginx (pid=2717)>]
+
+    Filtering on an attribute which is not in the snapshot runs ``ps``
+    as usual.
     """
 
+    # Attributes of the processes stored in snapshots
+    _snapshot_attributes: tuple[str, ...] = ()
+    # Attributes of the processes indexed in snapshots
+    _snapshot_indexes = ("pid", "ppid", "comm", "user")
+
+    @classmethod
+    def _get_snapshot(cls):
+        columns = {name: [] for name in cls._snapshot_attributes}
+        for attrs in cls()._get_processes(set(cls._snapshot_attributes)):
+            for name, values in columns.items():
+                values.append(attrs[name])
+        indexes = {}
+        for name in cls._snapshot_indexes:
+            index = indexes[name] = {}
+            for row, value in enumerate(columns[name]):
+                index.setdefault(str(value), []).append(row)
+        return {"columns": columns, "indexes": indexes}
+
+    def _filter_snapshot(self, filters):
+        # Yield the snapshot processes matching filters, candidates are
+        # selected with the most selective index
+        columns = self._snapshot["columns"]
+        indexes = self._snapshot["indexes"]
+        candidates = [
+            indexes[key].get(str(value), [])
+            for key, value in filters.items()
+            if key in indexes
+        ]
+        rows = min(candidates, key=len) if candidates else range(len(columns["pid"]))
+        for row in rows:
+            attrs = {name: values[row] for name, values in columns.items()}
+            if all(str(attrs[key]) == str(value) for key, value in filters.items()):
+                yield attrs
+
     def filter(self, **filters):
         """Get a list of matching process
 
         >>> host.process.filter(user="root", comm="zsh")
         [<process zsh (pid=2715)>, <process zsh (pid=10502)>, ...]
         """
+        if self._snapshot is not None and set(filters) <= set(
+            self._snapshot["columns"]
+        ):
+            processes = self._filter_snapshot(filters)
+        else:
+            processes = self._get_processes(set(filters))
         match = []
-        for attrs in self._get_processes(**filters):
+        for attrs in processes:
             for key, value in filters.items():
                 if str(attrs[key]) != str(value):
                     break
@@ -101,7 +163,115 @@ class Process(InstanceModule):
             raise RuntimeError(f"Multiple process found: {matches}")
         return matches[0]
 
-    def _get_processes(self, **filters):
+    def sample(self, processes, duration=10, interval=1, children=True):
+        """Sample processes resources usage over a time window
+
+        ``processes`` is a pid, a process returned by ``filter()`` or
+        ``get()``, a list of them or a dict of filters (selecting processes
+        when sampling starts). Unless ``children`` is False, descendants of
+        the processes (including ones started while sampling) are included.
+
+        The host runs a single sampling loop reading ``/proc`` every
+        ``interval`` seconds during ``duration`` seconds. Return a dict of
+        time series with one value per interval, summed over the sampled
+        processes:
+
+        - ``time``: seconds since sampling started (end of the interval)
+        - ``cpu``: CPU usage during the interval, in percent of one CPU
+        - ``rss``: resident memory at the end of the interval, in bytes
+        - ``read_bytes`` and ``write_bytes``: storage I/O during the
+          interval, in bytes (needs privileges on other users processes)
+        - ``threads``: number of threads at the end of the interval
+
+        and ``percentiles``, the 50, 90, 95, 99 and 100 (max) percentiles of
+        each series (see :func:`testinfra.utils.sampling.percentile`):
+
+        >>> workers = host.process.filter(comm="php-fpm")
+        >>> usage = host.process.sample(workers, duration=30, interval=0.5)
+        >>> usage["percentiles"]["cpu"][90]
+        12.5
+        >>> max(usage["rss"])
+        104857600
+
+        Only supported on Linux.
+        """
+        if self._host.system_info.type != "linux":
+            raise NotImplementedError
+        if isinstance(processes, dict):
+            processes = self.filter(**processes)
+        elif not isinstance(processes, (list, tuple, set)):
+            processes = [processes]
+        targets = {int(p["pid"] if isinstance(p, dict) else p) for p in processes}
+        out = self.check_output(
+            "getconf CLK_TCK && getconf PAGESIZE && "
+            + sampling_script(_SAMPLE_COMMANDS, duration, interval)
+        )
+        lines = out.splitlines()
+        clk_tck, pagesize = int(lines[0]), int(lines[1])
+        samples = []
+        for uptime, sample in iter_samples(lines[2:]):
+            stat, io = {}, {}
+            samples.append((uptime, stat, io))
+            for line in sample:
+                if line.startswith("/proc/"):
+                    # /proc/<pid>/io:read_bytes: <value>
+                    path, key, value = line.split(":")
+                    io.setdefault(int(path.split("/")[2]), {})[key] = int(value)
+                else:
+                    # pid (comm) state ppid ..., comm may contain spaces
+                    pid, rest = line.split(" (", 1)
+                    fields = rest.rsplit(") ", 1)[1].split()
+                    stat[int(pid)] = (
+                        int(fields[1]),  # ppid
+                        int(fields[11]) + int(fields[12]),  # utime + stime
+                        int(fields[17]),  # num_threads
+                        int(fields[21]) * pagesize,  # rss
+                    )
+
+        result = {"time": [], **{name: [] for name in _SAMPLE_METRICS}}
+        for (start, prev_stat, prev_io), (end, stat, io) in zip(samples, samples[1:]):
+            pids = self._get_sample_pids(stat, targets, children)
+            elapsed = end - start
+            ticks = read_bytes = write_bytes = 0
+            for pid in pids:
+                # Processes started during the interval count from zero
+                ticks += stat[pid][1] - prev_stat.get(pid, (0, 0))[1]
+                prev = prev_io.get(pid, {}) if pid in prev_stat else {}
+                for key, value in io.get(pid, {}).items():
+                    delta = max(0, value - prev.get(key, 0))
+                    if key == "read_bytes":
+                        read_bytes += delta
+                    else:
+                        write_bytes += delta
+            result["time"].append(round(end - samples[0][0], 2))
+            result["cpu"].append(
+                100 * ticks / clk_tck / elapsed if elapsed > 0 else 0.0
+            )
+            result["rss"].append(sum(stat[pid][3] for pid in pids))
+            result["read_bytes"].append(read_bytes)
+            result["write_bytes"].append(write_bytes)
+            result["threads"].append(sum(stat[pid][2] for pid in pids))
+        result["percentiles"] = percentiles(result, _SAMPLE_METRICS)
+        return result
+
+    @staticmethod
+    def _get_sample_pids(stat, targets, children):
+        # Return the sampled pids present in stat, with their descendants
+        pids = {pid for pid in targets if pid in stat}
+        if not children:
+            return pids
+        parents = {}
+        for pid, fields in stat.items():
+            parents.setdefault(fields[0], []).append(pid)
+        todo = list(pids)
+        while todo:
+            for child in parents.get(todo.pop(), ()):
+                if child not in pids:
+                    pids.add(child)
+                    todo.append(child)
+        return pids
+
+    def _get_processes(self, attributes):
         raise NotImplementedError
 
     def _get_process_attribute_by_pid(self, pid, name):
@@ -127,12 +297,35 @@ class Process(InstanceModule):
 class PosixProcess(Process):
     # Should be portable on both Linux and BSD
 
-    def _get_processes(self, **filters):
+    _snapshot_attributes = (
+        "args",
+        "comm",
+        "etime",
+        "lstart",
+        "nice",
+        "pcpu",
+        "pgid",
+        "pid",
+        "pmem",
+        "ppid",
+        "rgid",
+        "rss",
+        "ruid",
+        "ruser",
+        "stat",
+        "time",
+        "tty",
+        "uid",
+        "user",
+        "vsz",
+    )
+
+    def _get_processes(self, attributes):
         cmd = "ps -Aww -o %s"
         # "lstart" and "args" attributes contains spaces. Put them at the
         # end of the list.
         attributes = sorted(
-            ({"pid", "comm", "pcpu", "pmem"} | set(filters)) - {"lstart", "args"}
+            ({"pid", "comm", "pcpu", "pmem"} | attributes) - {"lstart", "args"}
         ) + ["lstart", "args"]
         arg = ":50,".join(attributes)
 
@@ -159,12 +352,26 @@ class PosixProcess(Process):
 
 
 class BusyboxProcess(Process):
-    def _get_processes(self, **filters):
+    _snapshot_attributes = (
+        "args",
+        "comm",
+        "etime",
+        "group",
+        "lstart",
+        "nice",
+        "pgid",
+        "pid",
+        "ppid",
+        "time",
+        "user",
+        "vsz",
+    )
+
+    def _get_processes(self, attributes):
         cmd = "ps -A -o %s"
         # "args" attribute contains spaces. Put them at the end of the list
-        attributes = sorted(({"pid", "comm", "time"} | set(filters)) - {"args"}) + [
-            "args"
-        ]
+        attributes = sorted(({"pid", "comm", "time"} | attributes) - {"args", "lstart"})
+        attributes.append("args")
         arg = ",".join(attributes)
 
         procs = []
@@ -10,10 +10,34 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
 import functools
+import re
 
 from testinfra.modules.base import Module
 
+# systemd time span units, see systemd.time(7)
+_TIMESPAN_UNITS = {
+    "y": 31557600,
+    "month": 2629800,
+    "w": 604800,
+    "d": 86400,
+    "h": 3600,
+    "min": 60,
+    "s": 1,
+    "ms": 1e-3,
+    "us": 1e-6,
+    "µs": 1e-6,
+}
+
+
+def _parse_timespan(value):
+    """Parse a systemd time span like "1min 2.345s" as a timedelta"""
+    seconds = 0.0
+    for number, unit in re.findall(r"([\d.]+)\s*([a-zµ]+)", value):
+        seconds += float(number) * _TIMESPAN_UNITS[unit]
+    return datetime.timedelta(seconds=seconds)
+
 
 class Service(Module):
     """Test services
@@ -27,12 +51,37 @@ class Service(Module):
     - NetBSD: ``/etc/rc.d/$name onestatus`` for ``is_running``
       (``is_enabled`` is not yet implemented)
 
+    Checking many services can be done from a single snapshot of the
+    service manager state (see :ref:`snapshots`): ``exists``,
+    ``is_running``, ``is_enabled`` and ``is_masked`` are then answered
+    without running commands for each service, services missing from the
+    snapshot are still queried directly.
+
+    >>> host.service.snapshot()
+    >>> host.service("nginx").is_running  # no command run
+    True
+
+    Snapshots are implemented for systemd (``systemctl list-units`` and
+    ``list-unit-files``), OpenRC (``rc-status -a``) and FreeBSD
+    (``service -e``, ``is_running`` is still queried directly).
     """
 
     def __init__(self, name):
         self.name = name
         super().__init__()
 
+    @classmethod
+    def get_services(cls):
+        """Return the list of services known by the service manager
+
+        The services are listed from the snapshot, or from a temporary one
+        if there is none. With systemd only ``.service`` units are listed.
+
+        >>> host.service.get_services()
+        [<service cron.service>, <service ssh.service>, ...]
+        """
+        return [cls(name) for name in sorted(cls._get_current_snapshot())]
+
     @property
     def exists(self):
         """Test if the service exists"""
@@ -57,6 +106,65 @@ class Service(Module):
         """
         raise NotImplementedError
 
+    @classmethod
+    def verify_many(cls, units):
+        """Verify many services (units) with a single ``systemd-analyze verify``
+
+        Return a `dict` of unit -> list of diagnostic lines, an empty list
+        means the unit is valid. Lines that cannot be attributed to a given
+        unit (e.g. about a dependency) are returned under the ``None`` key.
+
+        >>> host.service.verify_many(["ntp", "bad.service"])
+        {'ntp': [], 'bad.service': ["/etc/systemd/system/bad.service:3: Unknown key name 'Foo' in section 'Service', ignoring."]}
+
+        This method is only available in the systemd implementation,
+        it will raise ``NotImplementedError`` in other implementations.
+
+        :raises: RuntimeError if ``systemd-analyze`` is not available or
+                 fails without a diagnostic about any of the units
+        """
+        raise NotImplementedError
+
+    @property
+    def startup_time(self):
+        """Time the service (unit) took to start as a `datetime.timedelta`
+
+        Computed from the time it left the inactive state to the time it
+        entered the active state. Return None if the unit never started.
+
+        >>> host.service("nginx").startup_time
+        datetime.timedelta(microseconds=52316)
+
+        This method is only available in the systemd implementation,
+        it will raise ``NotImplementedError`` in other implementations.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def startup_report(cls):
+        """Return the boot startup report of the service manager
+
+        Return a `dict` with:
+
+        - ``blame``: `dict` of unit -> time it took to start, as
+          `datetime.timedelta`, slowest first
+        - ``critical_chain``: list of units of the critical chain from the
+          default target, as `dict` with ``unit``, ``activated`` (time after
+          boot when the unit became active) and ``time`` (time it took to
+          start, or None)
+
+        >>> report = host.service.startup_report()
+        >>> report["blame"]["nginx.service"]
+        datetime.timedelta(microseconds=52316)
+        >>> report["critical_chain"][0]
+        {'unit': 'graphical.target', 'activated': datetime.timedelta(seconds=4, microseconds=512000), 'time': None}
+
+        This method is only available in the systemd implementation
+        (``systemd-analyze blame`` and ``critical-chain``), it will raise
+        ``NotImplementedError`` in other implementations.
+        """
+        raise NotImplementedError
+
     @property
     def is_masked(self):
         """Test if service is masked
@@ -86,6 +194,36 @@ class Service(Module):
         """
         raise NotImplementedError
 
+    def properties(self, *names):
+        """Return the given properties of the service (unit) as a `dict`
+
+        Only query the given properties, which is faster than
+        :attr:`systemd_properties` when a few properties are needed.
+        Empty properties are not returned.
+
+        >>> host.service("ntp").properties("MainPID", "ActiveState")
+        {'MainPID': '1234', 'ActiveState': 'active'}
+
+        This method is only available in the systemd implementation,
+        it will raise ``NotImplementedError`` in other implementations.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def properties_many(cls, units, names):
+        """Return the given properties of many services (units)
+
+        All units are queried with a single command, the result is a
+        `dict` of unit -> properties `dict` like :meth:`properties`.
+
+        >>> host.service.properties_many(["ntp", "ssh"], ["MainPID"])
+        {'ntp': {'MainPID': '1234'}, 'ssh': {'MainPID': '567'}}
+
+        This method is only available in the systemd implementation,
+        it will raise ``NotImplementedError`` in other implementations.
+        """
+        raise NotImplementedError
+
     @classmethod
     def get_module_class(cls, host):
         if host.system_info.type == "linux":
@@ -146,6 +284,16 @@ class SysvService(Service):
             )
         )
 
+    def _get_wait_condition(self, attribute):
+        if attribute != "is_running":
+            return None
+        return (
+            self._host.backend.quote(
+                "%s %s status >/dev/null 2>&1", self._service_command, self.name
+            ),
+            None,
+        )
+
 
 class SystemdService(SysvService):
     suffix_list = [
@@ -167,6 +315,17 @@ class SystemdService(SysvService):
     See systemd.unit(5) for more details
     """
 
+    # is-enabled exit with 0 for these states
+    _enabled_states = {
+        "enabled",
+        "enabled-runtime",
+        "alias",
+        "static",
+        "indirect",
+        "generated",
+        "transient",
+    }
+
     def _has_systemd_suffix(self):
         """
         Check if service name has a known systemd unit suffix
@@ -174,8 +333,59 @@ class SystemdService(SysvService):
         unit_suffix = self.name.split(".")[-1]
         return unit_suffix in self.suffix_list
 
+    @classmethod
+    def _get_snapshot(cls):
+        units, _, unit_files = cls.check_output(
+            "systemctl list-units --all --plain --no-legend --no-pager && echo && "
+            "systemctl list-unit-files --no-legend --no-pager"
+        ).partition("\n\n")
+        snapshot = {}
+        for line in units.splitlines():
+            # failed units are prefixed by a bullet on some versions
+            fields = line.strip().removeprefix("●").split(None, 4)
+            if len(fields) < 4 or fields[1] == "not-found":
+                continue
+            snapshot[fields[0]] = {
+                "load": fields[1],
+                "active": fields[2],
+                "sub": fields[3],
+                "state": None,
+            }
+        for line in unit_files.splitlines():
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+            snapshot.setdefault(fields[0], {"load": None, "active": None, "sub": None})[
+                "state"
+            ] = fields[1]
+        return snapshot
+
+    @classmethod
+    def get_services(cls):
+        return [
+            service
+            for service in super().get_services()
+            if service.name.endswith(".service")
+        ]
+
+    def _get_snapshot_unit(self):
+        if self._snapshot is None:
+            return None
+        name = self.name if self._has_systemd_suffix() else f"{self.name}.service"
+        return self._snapshot.get(name)
+
     @property
     def exists(self):
+        if self._snapshot is not None:
+            for name in (self.name, f"{self.name}.service"):
+                unit = self._snapshot.get(name)
+                if unit is not None and unit["state"] is not None:
+                    return True
+            # Same as the grep below
+            return any(
+                name.startswith(self.name) and unit["state"] is not None
+                for name, unit in self._snapshot.items()
+            )
         cmd = self.run_test('systemctl list-unit-files | grep -q "^%s"', self.name)
         return cmd.rc == 0
 
@@ -186,14 +396,37 @@ class SystemdService(SysvService):
         # 1: program is dead and pid file exists
         # 3: not running and pid file does not exists
         # 4: Unable to determine status (no such unit)
+        unit = self._get_snapshot_unit()
+        if unit is not None and unit["active"] is not None:
+            return unit["active"] in ("active", "reloading")
         out = self.run_expect([0, 1, 3, 4], "systemctl is-active %s", self.name)
         if out.rc == 1:
             # Failed to connect to bus: No such file or directory
             return super().is_running
         return out.rc == 0
 
+    def _get_wait_condition(self, attribute):
+        if attribute != "is_running":
+            return None
+        # Same as is_running: fallback to sysv when systemctl exit with 1
+        sysv, _ = super()._get_wait_condition(attribute)
+        return (
+            self._host.backend.quote(
+                "{ systemctl is-active -q %s 2>/dev/null; r=$?; [ $r -eq 0 ] || ",
+                self.name,
+            )
+            + f"{{ [ $r -eq 1 ] && {sysv}; }}; }}",
+            None,
+        )
+
     @property
     def is_enabled(self):
+        unit = self._get_snapshot_unit()
+        if unit is not None:
+            if unit["state"] in self._enabled_states:
+                return True
+            if unit["state"] == "disabled":
+                return False
         cmd = self.run_test("systemctl is-enabled %s", self.name)
         if cmd.rc == 0:
             return True
@@ -219,21 +452,121 @@ class SystemdService(SysvService):
         assert (cmd.stdout, cmd.stderr) == ("", "")
         return True
 
+    @property
+    def startup_time(self):
+        props = self.properties(
+            "InactiveExitTimestampMonotonic", "ActiveEnterTimestampMonotonic"
+        )
+        start = int(props.get("InactiveExitTimestampMonotonic", 0))
+        end = int(props.get("ActiveEnterTimestampMonotonic", 0))
+        if not start or not end or end < start:
+            return None
+        return datetime.timedelta(microseconds=end - start)
+
+    @classmethod
+    def startup_report(cls):
+        out = cls.check_output(
+            "systemd-analyze blame --no-pager && echo --- && "
+            "systemd-analyze critical-chain --no-pager"
+        )
+        blame, _, critical_chain = out.partition("---\n")
+        report = {"blame": {}, "critical_chain": []}
+        # Lines are like "1min 2.345s nginx.service"
+        for line in blame.splitlines():
+            timespan, _, unit = line.strip().rpartition(" ")
+            if unit:
+                report["blame"][unit] = _parse_timespan(timespan)
+        # Lines are like "└─nginx.service @4.132s +52ms"
+        for line in critical_chain.splitlines():
+            match = re.match(r"^[\s│├└─]*(\S+\.\S+) @([^+]+)(?:\+(.+))?$", line)
+            if match is None:
+                continue
+            unit, activated, time = match.groups()
+            report["critical_chain"].append(
+                {
+                    "unit": unit,
+                    "activated": _parse_timespan(activated),
+                    "time": None if time is None else _parse_timespan(time),
+                }
+            )
+        return report
+
+    @classmethod
+    def verify_many(cls, units):
+        units = list(units)
+        if not units:
+            return {}
+        # systemd-analyze requires full unit names.
+        names = {
+            unit: unit if cls(unit)._has_systemd_suffix() else f"{unit}.service"
+            for unit in units
+        }
+        cmd = cls.run("systemd-analyze verify" + " %s" * len(units), *names.values())
+        if cmd.rc == 127:
+            raise RuntimeError(f"systemd-analyze is not available: {cmd}")
+        result = {unit: [] for unit in units}
+        for line in (cmd.stdout + cmd.stderr).splitlines():
+            if not line.strip():
+                continue
+            # Diagnostics are prefixed by either the unit name or the path of
+            # the unit file.
+            prefix = line.split(":", 1)[0]
+            for unit, name in names.items():
+                if prefix == name or prefix.endswith(f"/{name}"):
+                    result[unit].append(line)
+                    break
+            else:
+                result.setdefault(None, []).append(line)
+        # A failure which cannot be attributed to any unit (e.g. aborted
+        # early) must not report all units as valid
+        if cmd.rc != 0 and not any(result[unit] for unit in units):
+            raise RuntimeError(f"Failed to verify units: {cmd}")
+        return result
+
     @property
     def is_masked(self):
+        unit = self._get_snapshot_unit()
+        if unit is not None and unit["state"] is not None:
+            return unit["state"] == "masked"
         cmd = self.run_test("systemctl is-enabled %s", self.name)
         return cmd.stdout.strip() == "masked"
 
+    @staticmethod
+    def _parse_properties(out):
+        # maxsplit is required because values can contain `=`
+        return dict(pair.split("=", maxsplit=1) for pair in out.splitlines() if pair)
+
     @functools.cached_property
     def systemd_properties(self):
-        out = self.check_output("systemctl show %s", self.name)
-        out_d = {}
-        if out:
-            # maxsplit is required because values can contain `=`
-            out_d = dict(
-                map(lambda pair: pair.split("=", maxsplit=1), out.splitlines())
+        return self._parse_properties(self.check_output("systemctl show %s", self.name))
+
+    def properties(self, *names):
+        return self.properties_many([self.name], names)[self.name]
+
+    @classmethod
+    def properties_many(cls, units, names):
+        units = list(units)
+        if not units:
+            return {}
+        # Always query Id so each unit output a non empty record, records
+        # are separated by an empty line and are in the same order as units
+        query = list(names) if "Id" in names else [*names, "Id"]
+        args = [arg for name in query for arg in ("-p", name)]
+        out = cls.check_output(
+            "systemctl show" + " %s" * (len(args) + len(units)), *args, *units
+        )
+        records = out.split("\n\n")
+        if len(records) != len(units):
+            raise RuntimeError(
+                f"Unexpected systemctl show output for {len(units)} units: {out}"
             )
-        return out_d
+        result = {}
+        for unit, record in zip(units, records):
+            props = cls._parse_properties(record)
+            if "Id" not in names:
+                props.pop("Id", None)
+            result[unit] = props
+        return result
 
 
 class UpstartService(SysvService):
@@ -241,6 +574,9 @@ class UpstartService(SysvService):
     def exists(self):
         return self._host.file(f"/etc/init/{self.name}.conf").exists
 
+    def _get_wait_condition(self, attribute):
+        return None
+
     @property
     def is_enabled(self):
         if (
@@ -272,8 +608,44 @@ class OpenRCService(SysvService):
     def _service_command(self):
         return self.find_command("rc-service")
 
+    @classmethod
+    def _get_snapshot(cls):
+        # Output is like:
+        # Runlevel: default
+        #  sshd                  [  started  ]
+        # Dynamic Runlevel: manual
+        #  nginx                 [  started 00:01:02 (0)  ]
+        snapshot = {}
+        runlevel = None
+        for line in cls.check_output("rc-status -a").splitlines():
+            if line.startswith("Runlevel:"):
+                runlevel = line.split(":", 1)[1].strip()
+                continue
+            if line.startswith("Dynamic Runlevel:"):
+                runlevel = None
+                continue
+            match = re.match(r"^\s*(\S+)\s+\[\s*(\S+)", line)
+            if match is None:
+                continue
+            service = snapshot.setdefault(
+                match.group(1), {"status": match.group(2), "runlevels": []}
+            )
+            if runlevel is not None:
+                service["runlevels"].append(runlevel)
+        return snapshot
+
+    @property
+    def is_running(self):
+        if self._snapshot is not None and self.name in self._snapshot:
+            return self._snapshot[self.name]["status"] == "started"
+        return super().is_running
+
     @property
     def is_enabled(self):
+        if self._snapshot is not None:
+            # rc-status -a list services of all runlevels
+            service = self._snapshot.get(self.name)
+            return service is not None and bool(service["runlevels"])
         return bool(
             self.check_output(
                 "find /etc/runlevels/ -name %s",
@@ -283,8 +655,28 @@ class OpenRCService(SysvService):
 
 
 class FreeBSDService(Service):
+    @classmethod
+    def _get_snapshot(cls):
+        # service -e return paths of enabled services and ls /etc/rc.d
+        # return bare names
+        snapshot = {}
+        for line in cls.check_output("service -e && ls /etc/rc.d").splitlines():
+            if line.startswith("/"):
+                service = snapshot.setdefault(
+                    line.rsplit("/", 1)[1], {"exists": False, "enabled": False}
+                )
+                service["enabled"] = True
+            elif line:
+                snapshot.setdefault(line, {"exists": False, "enabled": False})[
+                    "exists"
+                ] = True
+        return snapshot
+
     @property
     def exists(self):
+        if self._snapshot is not None:
+            service = self._snapshot.get(self.name)
+            return service is not None and service["exists"]
         return self._host.file(f"/etc/rc.d/{self.name}").exists
 
     @property
@@ -293,6 +685,9 @@ class FreeBSDService(Service):
 
     @property
     def is_enabled(self):
+        if self._snapshot is not None:
+            service = self._snapshot.get(self.name)
+            return service is not None and service["enabled"]
         # Return list of enabled services like
         # /etc/rc.d/sshd
         # /etc/rc.d/sendmail
@@ -76,6 +76,16 @@ class Socket(Module):
       - All ipv6 sockets on port 22: ``tcp://:::22``
       - udp socket on 127.0.0.1 port 69: ``udp://127.0.0.1:69``
 
+    With a snapshot of all sockets (see :ref:`snapshots`),
+    ``is_listening``, ``clients`` and ``get_listening_sockets()`` are
+    answered without listing sockets on each call:
+
+    >>> host.socket.snapshot()
+    >>> host.socket("tcp://0.0.0.0:22").is_listening
+    True
+
+    On Linux the snapshot reads ``/proc/net`` in a single command
+    (falling back to ``ss`` or ``netstat``).
     """
 
     _command = None
@@ -106,7 +116,10 @@ class Socket(Module):
                   socket listens on **both** all ipv4 and ipv6 addresses
                   (i.e. 0.0.0.0 and ::)
         """
-        sockets = list(self._iter_sockets(True))
+        if self._snapshot is not None:
+            sockets = self._snapshot["listening"]
+        else:
+            sockets = list(self._iter_sockets(True))
         if self.protocol == "unix":
             return ("unix", self.host) in sockets
         allipv4 = (self.protocol, "0.0.0.0", self.port) in sockets
@@ -135,7 +148,12 @@ class Socket(Module):
 
         """
         sockets: list[Optional[tuple[str, int]]] = []
-        for sock in self._iter_sockets(False):
+        if self._snapshot is not None:
+            key = self.host if self.protocol == "unix" else self.port
+            candidates = self._snapshot["clients"].get((self.protocol, key), [])
+        else:
+            candidates = self._iter_sockets(False)
+        for sock in candidates:
             if sock[0] != self.protocol:
                 continue
 
@@ -164,13 +182,100 @@ class Socket(Module):
         ['tcp://0.0.0.0:22', 'tcp://:::22', 'unix:///run/systemd/private', ...]
         """
         sockets = []
-        for sock in cls(None)._iter_sockets(True):
-            if sock[0] == "unix":
-                sockets.append("unix://" + sock[1])
-            else:
-                sockets.append(f"{sock[0]}://{sock[1]}:{sock[2]}")
+        if cls._snapshot is not None:
+            listening = cls._snapshot["listening"]
+        else:
+            listening = cls(None)._iter_sockets(True)
+        for sock in listening:
+            sockets.append(cls._format_socket(sock))
         return sockets
 
+    @property
+    def owners(self):
+        """Return the processes owning the listening socket
+
+        A list of dict with the process ``pid``, ``comm`` and ``user`` is
+        returned, like :meth:`listening_with_processes`. Without enough
+        privileges (e.g. not root), sockets of other users processes have
+        ``None`` values.
+
+        >>> host.socket("tcp://0.0.0.0:443").owners
+        [{'pid': 1234, 'comm': 'nginx', 'user': 'root'}]
+        """
+        owners = []
+        for sock, process in self._iter_listening_processes():
+            if sock[0] != self.protocol:
+                continue
+            if self.protocol == "unix":
+                if sock[1] != self.host:
+                    continue
+            elif sock[2] != self.port or (
+                self.host is not None
+                and sock[1] != self.host
+                and sock[1] != "::"
+                and (sock[1] != "0.0.0.0" or ":" in self.host)
+            ):
+                continue
+            if process not in owners:
+                owners.append(process)
+        return owners
+
+    @classmethod
+    def listening_with_processes(cls):
+        """Return all listening sockets with the processes owning them
+
+        Sockets and processes are listed with a single command, making
+        possible to check the owner of every listening port at once:
+
+        >>> host.socket.listening_with_processes()
+        [{'socket': 'tcp://0.0.0.0:22', 'pid': 612, 'comm': 'sshd', 'user': 'root'},
+         {'socket': 'unix:///run/systemd/private', 'pid': 1, 'comm': 'systemd',
+          'user': 'root'},
+         ...]
+
+        A socket shared by several processes (e.g. forked workers) is listed
+        once per process. Without enough privileges (e.g. not root), sockets
+        of other users processes have ``None`` pid, comm and user.
+
+        Only supported on Linux, it reads ``/proc/net`` and ``/proc/*/fd``.
+        """
+        return [
+            {"socket": cls._format_socket(sock), **process}
+            for sock, process in cls._iter_listening_processes()
+        ]
+
+    @staticmethod
+    def _format_socket(sock):
+        if sock[0] == "unix":
+            return "unix://" + sock[1]
+        return f"{sock[0]}://{sock[1]}:{sock[2]}"
+
+    @classmethod
+    def _iter_listening_processes(cls):
+        # Yield (socket, {"pid": ..., "comm": ..., "user": ...})
+        raise NotImplementedError
+
+    @classmethod
+    def _get_snapshot(cls):
+        listening = {}
+        clients = {}
+        for is_listening, sock in cls._iter_snapshot_sockets():
+            if is_listening:
+                listening[sock] = None
+            else:
+                key = (sock[0], sock[1] if sock[0] == "unix" else sock[2])
+                clients.setdefault(key, []).append(sock)
+        return {"listening": listening, "clients": clients}
+
+    @classmethod
+    def _iter_snapshot_sockets(cls):
+        # Yield (listening, socket) where socket is a tuple like the ones
+        # yield by _iter_sockets()
+        sock = cls(None)
+        for listening in (True, False):
+            for item in sock._iter_sockets(listening):
+                yield listening, item
+
     def _iter_sockets(self, listening):
         raise NotImplementedError
 
@@ -203,7 +308,187 @@ class Socket(Module):
         raise NotImplementedError
 
 
-class LinuxSocketSS(Socket):
+# Exit 0 if a socket listen on port p, either on all addresses or on address h
+_SS_LISTENING_SCRIPT = """
+NR > 1 {
+    port = $4
+    sub(/.*:/, "", port)
+    host = substr($4, 1, length($4) - length(port) - 1)
+    gsub(/^\\[|\\]$/, "", host)
+    if (port == p && (host == "::" || host == "*" || host == h)) {
+        found = 1
+    }
+}
+END {
+    exit !found
+}
+"""
+
+
+# /proc/net/tcp states, see include/net/tcp_states.h
+_TCP_ESTABLISHED = 1
+_TCP_CLOSE = 7
+_TCP_LISTEN = 10
+# /proc/net/unix flags and type
+_SO_ACCEPTCON = 0x10000
+_SOCK_STREAM = 1
+_SS_CONNECTED = 3
+
+
+def _parse_proc_net_address(address, byteorder):
+    # Addresses are in network byte order, but printed as 32 bits integers
+    # in host byte order
+    host, port = address.split(":")
+    raw = bytes.fromhex(host)
+    if byteorder == "little":
+        raw = b"".join(raw[i : i + 4][::-1] for i in range(0, len(raw), 4))
+    family = socket.AF_INET if len(raw) == 4 else socket.AF_INET6
+    return socket.inet_ntop(family, raw), int(port, 16)
+
+
+def _split_sections(output):
+    # Split an output made of sections preceded by "== <name>" lines
+    sections = {}
+    lines = None
+    for line in output.splitlines():
+        if line.startswith("== "):
+            lines = sections.setdefault(line[3:], [])
+        elif lines is not None:
+            lines.append(line)
+    return sections
+
+
+def _get_byteorder(sections):
+    # Return the byte order of the host from "printf ab | od -An -tx2", None
+    # if unknown
+    return {"6261": "little", "6162": "big"}.get(
+        "".join(sections.get("byteorder", ())).strip()
+    )
+
+
+def _parse_proc_net(sections):
+    # Parse the content of /proc/net/{tcp,tcp6,udp,udp6,unix}
+    # Yield (listening, socket, inode) with socket like Socket._iter_sockets()
+    byteorder = _get_byteorder(sections)
+    for name in ("tcp", "tcp6", "udp", "udp6", "unix"):
+        for line in sections.get(name, ()):
+            splitted = line.split()
+            if not splitted or splitted[0] in ("sl", "Num"):
+                # header
+                continue
+            if name == "unix":
+                # Num RefCount Protocol Flags Type St Inode [Path]
+                if len(splitted) < 8 or int(splitted[4], 16) != _SOCK_STREAM:
+                    continue
+                inode = int(splitted[6])
+                path = splitted[7]
+                if int(splitted[3], 16) & _SO_ACCEPTCON:
+                    yield True, ("unix", path), inode
+                elif int(splitted[5], 16) == _SS_CONNECTED:
+                    yield False, ("unix", path), inode
+                continue
+            # sl local_address rem_address st ... uid timeout inode
+            protocol = name[:3]
+            host, port = _parse_proc_net_address(splitted[1], byteorder)
+            state = int(splitted[3], 16)
+            inode = int(splitted[9])
+            if (protocol == "tcp" and state == _TCP_LISTEN) or (
+                protocol == "udp" and state == _TCP_CLOSE
+            ):
+                yield True, (protocol, host, port), inode
+            elif state == _TCP_ESTABLISHED:
+                remote_host, remote_port = _parse_proc_net_address(
+                    splitted[2], byteorder
+                )
+                yield False, (protocol, host, port, remote_host, remote_port), inode
+
+
+def _parse_proc_fd(lines):
+    # Parse "ls -l /proc/[0-9]*/fd", return {socket inode: [pid, ...]}
+    inodes = {}
+    pid = None
+    for line in lines:
+        if line.startswith("/proc/") and line.endswith(":"):
+            pid = int(line.split("/")[2])
+        elif pid is not None and "-> socket:[" in line:
+            inode = int(line.rsplit("[", 1)[1].rstrip("]"))
+            pids = inodes.setdefault(inode, [])
+            if pid not in pids:
+                pids.append(pid)
+    return inodes
+
+
+_PROC_NET_COMMAND = (
+    'echo "== byteorder"; printf ab | od -An -tx2 2>/dev/null; '
+    "for f in tcp tcp6 udp udp6 unix; do "
+    '[ -r /proc/net/$f ] && echo "== $f" && cat /proc/net/$f; '
+    "done; true"
+)
+
+
+class LinuxSocket(Socket):
+    @classmethod
+    def _iter_snapshot_sockets(cls):
+        out = cls.run(_PROC_NET_COMMAND)
+        sections = _split_sections(out.stdout)
+        if out.rc != 0 or "tcp" not in sections or _get_byteorder(sections) is None:
+            return super()._iter_snapshot_sockets()
+        return ((listening, sock) for listening, sock, _ in _parse_proc_net(sections))
+
+    @classmethod
+    def _iter_listening_processes(cls):
+        out = cls.check_output(
+            _PROC_NET_COMMAND
+            + '; echo "== fd"; ls -l /proc/[0-9]*/fd 2>/dev/null'
+            + '; echo "== ps"; ps -A -o pid= -o user:50= -o comm='
+        )
+        sections = _split_sections(out)
+        if "tcp" not in sections:
+            raise RuntimeError("Cannot read /proc/net/tcp")
+        if _get_byteorder(sections) is None:
+            raise RuntimeError("Cannot detect the byte order of the host")
+        processes = {}
+        for line in sections.get("ps", ()):
+            pid, user, comm = line.split(None, 2)
+            processes[int(pid)] = {"pid": int(pid), "comm": comm, "user": user}
+        inodes = _parse_proc_fd(sections.get("fd", ()))
+        for listening, sock, inode in _parse_proc_net(sections):
+            if not listening:
+                continue
+            for pid in inodes.get(inode, [None]):
+                yield (
+                    sock,
+                    processes.get(pid, {"pid": pid, "comm": None, "user": None}),
+                )
+
+
+class LinuxSocketSS(LinuxSocket):
+    def _get_wait_condition(self, attribute):
+        if attribute != "is_listening":
+            return None
+        quote = self._host.backend.quote
+        if self.protocol == "unix":
+            return (
+                quote(
+                    "%s --numeric --listening --unix | "
+                    'awk -v p=%s \'$1 == "u_str" && $5 == p { found = 1 } '
+                    "END { exit !found }'",
+                    self._command,
+                    self.host,
+                ),
+                None,
+            )
+        return (
+            quote(
+                f"%s --numeric --listening --{self.protocol} | awk -v p=%s -v h=%s %s",
+                self._command,
+                str(self.port),
+                self.host or "",
+                _SS_LISTENING_SCRIPT,
+            ),
+            None,
+        )
+
     def _iter_sockets(self, listening):
         cmd = "%s --numeric"
         if listening:
@@ -269,7 +554,7 @@ class LinuxSocketSS(Socket):
                     yield protocol, remote
 
 
-class LinuxSocketNetstat(Socket):
+class LinuxSocketNetstat(LinuxSocket):
     def _iter_sockets(self, listening):
         cmd = "%s -n"
 
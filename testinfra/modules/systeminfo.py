@@ -28,6 +28,9 @@ class SystemInfo(InstanceModule):
             "release": None,
             "arch": None,
         }
+        if self._host.backend.get_connection_type() == "image":
+            sysinfo.update(**self._get_image_sysinfo())
+            return sysinfo
         uname = self.run_expect([0, 1], "uname -s")
         if uname.rc == 1 or uname.stdout.lower().startswith("msys"):
             # FIXME: find a better way to detect windows here
@@ -50,23 +53,9 @@ class SystemInfo(InstanceModule):
     def _get_linux_sysinfo(self):
         sysinfo = {}
 
-        # https://www.freedesktop.org/software/systemd/man/os-release.html
         os_release = self.run("cat /etc/os-release")
         if os_release.rc == 0:
-            for line in os_release.stdout.splitlines():
-                for key, attname in (
-                    ("ID=", "distribution"),
-                    ("VERSION_ID=", "release"),
-                    ("VERSION_CODENAME=", "codename"),
-                ):
-                    if line.startswith(key):
-                        sysinfo[attname] = (
-                            line[len(key) :].replace('"', "").replace("'", "").strip()
-                        )
-            # Arch doesn't have releases
-            if "distribution" in sysinfo and sysinfo["distribution"] == "arch":
-                sysinfo["release"] = "rolling"
-            return sysinfo
+            return self._parse_os_release(os_release.stdout)
 
         # RedHat / CentOS 6 haven't /etc/os-release
         redhat_release = self.run("cat /etc/redhat-release")
@@ -102,6 +91,46 @@ class SystemInfo(InstanceModule):
 
         return sysinfo
 
+    @staticmethod
+    def _parse_os_release(content):
+        # https://www.freedesktop.org/software/systemd/man/os-release.html
+        sysinfo = {}
+        for line in content.splitlines():
+            for key, attname in (
+                ("ID=", "distribution"),
+                ("VERSION_ID=", "release"),
+                ("VERSION_CODENAME=", "codename"),
+            ):
+                if line.startswith(key):
+                    sysinfo[attname] = (
+                        line[len(key) :].replace('"', "").replace("'", "").strip()
+                    )
+        # Arch doesn't have releases
+        if "distribution" in sysinfo and sysinfo["distribution"] == "arch":
+            sysinfo["release"] = "rolling"
+        return sysinfo
+
+    def _get_image_sysinfo(self):
+        backend = self._host.backend
+        config = backend.config
+        sysinfo = {"type": config.get("os")}
+        arch = config.get("architecture")
+        sysinfo["arch"] = {"amd64": "x86_64", "arm64": "aarch64"}.get(arch, arch)
+        for path in ("/etc/os-release", "/usr/lib/os-release"):
+            try:
+                content = backend.decode(backend.read(path))
+            except (FileNotFoundError, IsADirectoryError):
+                continue
+            sysinfo.update(**self._parse_os_release(content))
+            return sysinfo
+        try:
+            release = backend.decode(backend.read("/etc/alpine-release"))
+        except (FileNotFoundError, IsADirectoryError):
+            return sysinfo
+        sysinfo["distribution"] = "alpine"
+        sysinfo["release"] = release.strip()
+        return sysinfo
+
     def _get_darwin_sysinfo(self):
         sysinfo = {}
 
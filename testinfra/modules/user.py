@@ -14,17 +14,133 @@ import datetime
 
 from testinfra.modules.base import Module
 
+_IDENTITY_SNAPSHOT_COMMAND = (
+    "getent passwd; echo ==; getent shadow 2>/dev/null; echo ==; getent group; "
+    "echo ==; cat /etc/passwd; echo ==; cat /etc/group"
+)
+
+
+def _index_identities(passwd, shadow, group, local_users, local_groups):
+    # Index the identity databases entries (lists of fields) by name, uid
+    # and gid. shadow is None if it cannot be read
+    users = {}
+    uids = {}
+    for fields in passwd:
+        users.setdefault(fields[0], fields)
+        uids.setdefault(fields[2], fields)
+    groups = {}
+    gids = {}
+    members = {}
+    for fields in group:
+        fields = (fields + ["", "", ""])[:4]
+        groups.setdefault(fields[0], fields)
+        gids.setdefault(fields[2], fields)
+        for member in fields[3].split(","):
+            if member:
+                members.setdefault(member, []).append(fields)
+    return {
+        "users": users,
+        "uids": uids,
+        "all_users": [fields[0] for fields in passwd],
+        "local_users": local_users,
+        "shadow": None if shadow is None else {f[0]: f for f in shadow},
+        "groups": groups,
+        "gids": gids,
+        "all_groups": [fields[0] for fields in group],
+        "local_groups": local_groups,
+        "members": members,
+    }
+
 
 class User(Module):
     """Test unix users
 
     If name is not supplied, test the current user
+
+    A snapshot (see :ref:`snapshots`) fetches the passwd, shadow and group
+    databases with a single command and indexes them by name, uid and gid.
+    The snapshot is shared with ``host.group`` and all properties of users
+    and groups are then answered without running ``id`` or ``getent`` for
+    each one:
+
+    >>> host.user.snapshot()
+    >>> host.user("www-data").home
+    '/var/www'
+    >>> host.group("www-data").members
+    []
+
+    Entries of the shadow database are only in the snapshot if it can be
+    read (e.g. as root), otherwise shadow properties still run
+    ``getent shadow``.
     """
 
     def __init__(self, name=None):
         self._name = name
         super().__init__()
 
+    @classmethod
+    def snapshot(cls):
+        super().snapshot()
+        cls._host.group._snapshot = cls._snapshot
+
+    @classmethod
+    def clear_snapshot(cls):
+        super().clear_snapshot()
+        cls._host.group._snapshot = None
+
+    @classmethod
+    def _get_snapshot(cls):
+        return _index_identities(**cls._get_identities())
+
+    @classmethod
+    def _get_identities(cls):
+        # Return the arguments of _index_identities()
+        sections: list[list[list[str]]] = [[]]
+        for line in cls.check_output(_IDENTITY_SNAPSHOT_COMMAND).splitlines():
+            if line == "==":
+                sections.append([])
+            elif line:
+                sections[-1].append(line.split(":"))
+        passwd, shadow, group, local_passwd, local_group = sections
+        return {
+            "passwd": passwd,
+            "shadow": shadow or None,
+            "group": group,
+            # strip NIS compat mode entries
+            "local_users": [
+                fields[0] for fields in local_passwd if not fields[0].startswith("+")
+            ],
+            "local_groups": [fields[0] for fields in local_group],
+        }
+
+    @classmethod
+    def _get_snapshot_data(cls):
+        # Return the snapshot or None
+        return cls._snapshot
+
+    def _get_snapshot_entry(self):
+        # Return the passwd entry of the user from the snapshot, [] if the
+        # user does not exist or None if there is no snapshot
+        snapshot = self._get_snapshot_data()
+        if snapshot is None:
+            return None
+        entry = snapshot["users"].get(self.name)
+        if entry is None and self.name.isdigit():
+            entry = snapshot["uids"].get(self.name)
+        return entry or []
+
+    def _get_snapshot_groups(self):
+        # Return the [(gid, name), ...] of the user groups from the snapshot,
+        # primary group first like "id -G"
+        snapshot = self._get_snapshot_data()
+        entry = self._get_passwd()
+        primary = snapshot["gids"].get(entry[3])
+        groups = [(entry[3], entry[3] if primary is None else primary[0])]
+        for fields in snapshot["members"].get(entry[0], []):
+            if fields[2] != entry[3]:
+                groups.append((fields[2], fields[0]))
+        return groups
+
     @property
     def name(self):
         """Return the username"""
@@ -43,26 +159,37 @@ class User(Module):
 
         """
 
+        entry = self._get_snapshot_entry()
+        if entry is not None:
+            return bool(entry)
         return self.run_test("id %s", self.name).rc == 0
 
     @property
     def uid(self):
         """Return user ID"""
+        if self._get_snapshot_data() is not None:
+            return int(self._get_passwd()[2])
         return int(self.check_output("id -u %s", self.name))
 
     @property
     def gid(self):
         """Return effective group ID"""
+        if self._get_snapshot_data() is not None:
+            return int(self._get_passwd()[3])
         return int(self.check_output("id -g %s", self.name))
 
     @property
     def group(self):
         """Return effective group name"""
+        if self._get_snapshot_data() is not None:
+            return self._get_snapshot_groups()[0][1]
         return self.check_output("id -ng %s", self.name)
 
     @property
     def gids(self):
         """Return the list of user group IDs"""
+        if self._get_snapshot_data() is not None:
+            return [int(gid) for gid, _ in self._get_snapshot_groups()]
         return [
             int(gid)
             for gid in self.check_output(
@@ -74,27 +201,48 @@ class User(Module):
     @property
     def groups(self):
         """Return the list of user group names"""
+        if self._get_snapshot_data() is not None:
+            return [name for _, name in self._get_snapshot_groups()]
         return self.check_output("id -nG %s", self.name).split(" ")
 
+    def _get_passwd(self):
+        # Fields of the passwd entry
+        entry = self._get_snapshot_entry()
+        if entry is not None:
+            if not entry:
+                raise RuntimeError(f"No such user: {self.name}")
+            return entry
+        return self.check_output("getent passwd %s", self.name).split(":")
+
+    def _get_shadow(self):
+        # Fields of the shadow entry
+        snapshot = self._get_snapshot_data()
+        if snapshot is not None and snapshot["shadow"] is not None:
+            try:
+                return snapshot["shadow"][self._get_passwd()[0]]
+            except KeyError:
+                raise RuntimeError(f"No shadow entry for user: {self.name}") from None
+        return self.check_output("getent shadow %s", self.name).split(":")
+
     @property
     def home(self):
         """Return the user home directory"""
-        return self.check_output("getent passwd %s", self.name).split(":")[5]
+        return self._get_passwd()[5]
 
     @property
     def shell(self):
         """Return the user login shell"""
-        return self.check_output("getent passwd %s", self.name).split(":")[6]
+        return self._get_passwd()[6]
 
     @property
     def password(self):
         """Return the encrypted user password"""
-        return self.check_output("getent shadow %s", self.name).split(":")[1]
+        return self._get_shadow()[1]
 
     @property
     def password_max_days(self):
         """Return the maximum number of days between password changes"""
-        days = self.check_output("getent shadow %s", self.name).split(":")[4]
+        days = self._get_shadow()[4]
         try:
             return int(days)
         except ValueError:
@@ -103,7 +251,7 @@ class User(Module):
     @property
     def password_min_days(self):
         """Return the minimum number of days between password changes"""
-        days = self.check_output("getent shadow %s", self.name).split(":")[3]
+        days = self._get_shadow()[3]
         try:
             return int(days)
         except ValueError:
@@ -112,7 +260,7 @@ class User(Module):
     @property
     def gecos(self):
         """Return the user comment/gecos field"""
-        return self.check_output("getent passwd %s", self.name).split(":")[4]
+        return self._get_passwd()[4]
 
     @property
     def expiration_date(self):
@@ -123,7 +271,7 @@ class User(Module):
         >>> host.user("root").expiration_date
         None
         """
-        days = self.check_output("getent shadow %s", self.name).split(":")[7]
+        days = self._get_shadow()[7]
         try:
             days = int(days)
         except ValueError:
@@ -140,12 +288,32 @@ class User(Module):
         >>> host.user().get_all_users
         ["root", "bin", "daemon", "lp", <...>]
         """
+        snapshot = self._get_snapshot_data()
+        if snapshot is not None:
+            return list(snapshot["all_users"])
         all_users = [
             line.split(":")[0]
             for line in self.check_output("getent passwd").splitlines()
         ]
         return all_users
 
+    def iter_all_users(self):
+        """Iterate on local and remote usernames
+
+        Like :attr:`get_all_users` but ``getent passwd`` output is read by
+        chunks (see :meth:`testinfra.host.Host.iter_output`), memory usage
+        stays bounded with huge directories (LDAP, SSSD, ...)
+
+        >>> sum(1 for _ in host.user().iter_all_users())
+        400000
+        """
+        snapshot = self._get_snapshot_data()
+        if snapshot is not None:
+            yield from snapshot["all_users"]
+            return
+        for line in self.iter_output("getent passwd"):
+            yield line.split(":", 1)[0]
+
     @property
     def get_local_users(self):
         """Returns a list of local usernames
@@ -153,6 +321,9 @@ class User(Module):
         >>> host.user().get_local_users
         ["root", "bin", "daemon", "lp", <...>]
         """
+        snapshot = self._get_snapshot_data()
+        if snapshot is not None:
+            return list(snapshot["local_users"])
         local_users = [
             line.split(":")[0]
             for line in self.check_output("cat /etc/passwd").splitlines()
@@ -163,6 +334,8 @@ class User(Module):
 
     @classmethod
     def get_module_class(cls, host):
+        if host.backend.get_connection_type() == "image":
+            return ImageUser
         if host.system_info.type.endswith("bsd"):
             return BSDUser
         if host.system_info.type == "windows":
@@ -176,11 +349,11 @@ class User(Module):
 class BSDUser(User):
     @property
     def password(self):
-        return self.check_output("getent passwd %s", self.name).split(":")[1]
+        return self._get_passwd()[1]
 
     @property
     def expiration_date(self):
-        seconds = self.check_output("getent passwd %s", self.name).split(":")[6]
+        seconds = self._get_passwd()[6]
         try:
             seconds = int(seconds)
         except ValueError:
@@ -265,3 +438,41 @@ class WindowsUser(User):
         if expiration == "Never":
             return None
         return datetime.datetime.strptime(expiration, "%m/%d/%Y %H:%M%S %p")
+
+
+class ImageUser(User):
+    """Users of a container image read with the image backend
+
+    The current user is the user of the image configuration.
+    """
+
+    @property
+    def name(self):
+        if self._name is None:
+            user = self._host.backend.config.get("config", {}).get("User") or "root"
+            user = user.split(":", 1)[0]
+            if user.isdigit():
+                entry = self._get_snapshot_data()["uids"].get(user)
+                if entry is not None:
+                    user = entry[0]
+            self._name = user
+        return self._name
+
+    @classmethod
+    def _get_identities(cls):
+        getent = cls._host.backend.getent
+        users = [fields[0] for fields in getent("passwd")]
+        return {
+            "passwd": getent("passwd"),
+            "shadow": getent("shadow"),
+            "group": getent("group"),
+            "local_users": users,
+            "local_groups": [fields[0] for fields in getent("group")],
+        }
+
+    @classmethod
+    def _get_snapshot_data(cls):
+        # The image files cannot change, always use a snapshot
+        if cls._snapshot is None:
+            cls.snapshot()
+        return cls._snapshot
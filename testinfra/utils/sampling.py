@@ -0,0 +1,79 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+from collections.abc import Iterable, Iterator, Sequence
+
+__all__ = ["percentile", "percentiles", "sampling_script", "iter_samples"]
+
+PERCENTILES = (50, 90, 95, 99, 100)
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """Return the p-th percentile (0 to 100) of values
+
+    Values are linearly interpolated between the closest ranks, like the
+    default method of numpy.percentile()
+
+    >>> percentile([1, 2, 3, 4], 50)
+    2.5
+    """
+    if not values:
+        raise ValueError("percentile of empty values")
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def percentiles(
+    series: dict[str, Sequence[float]], names: Iterable[str]
+) -> dict[str, dict[int, float]]:
+    """Return the 50, 90, 95, 99 and 100 (max) percentiles of each series"""
+    return {
+        name: {p: percentile(series[name], p) for p in PERCENTILES} for name in names
+    }
+
+
+def sampling_script(commands: str, duration: float, interval: float) -> str:
+    """Return a shell loop running commands every interval during duration
+
+    Each sample starts with a ``== <uptime>`` line followed by the output
+    of commands, which is parsed by :func:`iter_samples`. There is one more
+    sample than intervals, the first one being the initial state.
+    """
+    count = max(1, math.ceil(duration / interval))
+    return (
+        "i=0 && while :; do "
+        'echo "== $(cut -d " " -f 1 /proc/uptime)"; '
+        f"{commands}; "
+        f'[ "$i" -ge {count} ] && break; i=$((i + 1)); sleep {interval}; done'
+    )
+
+
+def iter_samples(lines: Iterable[str]) -> Iterator[tuple[float, list[str]]]:
+    """Parse the output of :func:`sampling_script`
+
+    Yield (uptime, lines) for each sample.
+    """
+    sample: list[str] = []
+    uptime = None
+    for line in lines:
+        if line.startswith("== "):
+            if uptime is not None:
+                yield uptime, sample
+            uptime, sample = float(line[3:]), []
+        else:
+            sample.append(line)
+    if uptime is not None:
+        yield uptime, sample